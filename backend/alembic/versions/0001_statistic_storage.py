@@ -0,0 +1,154 @@
+"""Almacenamiento columnar de estadísticas
+
+Agrega la columna statistics.version y las tablas ingest_jobs, widget_series
+y statistic_versions, y mueve las filas que las estadísticas existentes
+guardan en Statistic.data al almacenamiento columnar como versión 1,
+dejando en Statistic.data solo el resumen.
+
+Revision ID: 0001_statistic_storage
+Revises:
+Create Date: 2026-10-18
+"""
+from datetime import datetime
+import json
+
+from alembic import op
+import pandas as pd
+import sqlalchemy as sa
+
+from app.core import storage
+
+revision = "0001_statistic_storage"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+statistics = sa.table(
+    "statistics",
+    sa.column("id", sa.Integer),
+    sa.column("data", sa.JSON),
+    sa.column("version", sa.Integer),
+    sa.column("metadata", sa.JSON),
+)
+statistic_versions = sa.table(
+    "statistic_versions",
+    sa.column("statistic_id", sa.Integer),
+    sa.column("version", sa.Integer),
+    sa.column("change", sa.String),
+    sa.column("data", sa.JSON),
+    sa.column("created_at", sa.DateTime),
+    sa.column("updated_at", sa.DateTime),
+)
+
+def timestamps() -> list:
+    return [
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    ]
+
+def is_summary(data) -> bool:
+    return isinstance(data, dict) and data.get("storage") == "parquet"
+
+def rows_dataframe(data) -> pd.DataFrame:
+    """
+    Filas guardadas en Statistic.data: una lista de registros (cargas desde
+    Excel) o un diccionario de columnas (actualizaciones)
+    """
+    if not data:
+        return pd.DataFrame()
+    try:
+        return pd.DataFrame(data)
+    except ValueError:
+        return pd.DataFrame([data])
+
+def upgrade() -> None:
+    op.add_column("statistics", sa.Column("version", sa.Integer, nullable=False, server_default="1"))
+    op.create_index("ix_statistics_category", "statistics", ["category"])
+    op.create_index("ix_statistics_source_file", "statistics", ["source_file"])
+
+    op.create_table(
+        "ingest_jobs",
+        *timestamps(),
+        sa.Column("status", sa.Enum("PENDING", "RUNNING", "COMPLETED", "FAILED", name="jobstatus"), nullable=False),
+        sa.Column("file_path", sa.String, nullable=False),
+        sa.Column("source_file", sa.String, nullable=False),
+        sa.Column("title", sa.String, nullable=False),
+        sa.Column("description", sa.String),
+        sa.Column("category", sa.String, nullable=False),
+        sa.Column("total_bytes", sa.BigInteger),
+        sa.Column("bytes_read", sa.BigInteger),
+        sa.Column("rows_parsed", sa.Integer),
+        sa.Column("error", sa.String),
+        sa.Column("batch_id", sa.String, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("statistic_id", sa.Integer, sa.ForeignKey("statistics.id", ondelete="SET NULL")),
+    )
+    op.create_table(
+        "widget_series",
+        *timestamps(),
+        sa.Column("config_id", sa.Integer, sa.ForeignKey("dashboard_configs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("widget_id", sa.String, nullable=False),
+        sa.Column("widget_hash", sa.String, nullable=False),
+        sa.Column("statistic_id", sa.Integer, index=True),
+        sa.Column("statistic_version", sa.Integer),
+        sa.Column("data", sa.JSON),
+        sa.Column("error", sa.String),
+        sa.UniqueConstraint("config_id", "widget_id"),
+    )
+    op.create_table(
+        "statistic_versions",
+        *timestamps(),
+        sa.Column("statistic_id", sa.Integer, sa.ForeignKey("statistics.id", ondelete="CASCADE"), nullable=False, index=True),
+        sa.Column("version", sa.Integer, nullable=False),
+        sa.Column("change", sa.Enum("UPLOAD", "UPDATE", "APPEND", "UPSERT", name="versionchange"), nullable=False),
+        sa.Column("data", sa.JSON, nullable=False),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+        sa.UniqueConstraint("statistic_id", "version"),
+    )
+
+    # Las filas se mueven de a una estadística, para no cargar todas en memoria
+    bind = op.get_bind()
+    ids = bind.execute(sa.select(statistics.c.id).order_by(statistics.c.id)).scalars().all()
+    for statistic_id in ids:
+        row = bind.execute(
+            sa.select(statistics.c.data, statistics.c["metadata"].label("extra")).where(statistics.c.id == statistic_id)
+        ).first()
+        if is_summary(row.data):
+            continue
+        summary = storage.write_statistic_chunks(statistic_id, 1, [rows_dataframe(row.data)])
+        metadata = {
+            **(row.extra or {}),
+            "columns": summary["columns"],
+            "rows": summary["rows"],
+            "schema": storage.read_statistic_schema(statistic_id, 1),
+        }
+        bind.execute(
+            statistics.update().where(statistics.c.id == statistic_id).values(
+                data=summary, version=1, metadata=metadata
+            )
+        )
+        now = datetime.utcnow()
+        bind.execute(statistic_versions.insert().values(
+            statistic_id=statistic_id, version=1, change="UPLOAD", data=summary, created_at=now, updated_at=now
+        ))
+
+def downgrade() -> None:
+    # Las filas de la versión vigente vuelven a Statistic.data como lista de registros
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(statistics.c.id, statistics.c.version, statistics.c.data)).all()
+    for row in rows:
+        if not is_summary(row.data):
+            continue
+        df = storage.decode_categoricals(storage.read_statistic_data(row.id, row.version))
+        records = json.loads(df.to_json(orient="records", date_format="iso"))
+        bind.execute(statistics.update().where(statistics.c.id == row.id).values(data=records))
+
+    op.drop_table("statistic_versions")
+    op.drop_table("widget_series")
+    op.drop_table("ingest_jobs")
+    sa.Enum(name="versionchange").drop(bind, checkfirst=True)
+    sa.Enum(name="jobstatus").drop(bind, checkfirst=True)
+    op.drop_index("ix_statistics_source_file", "statistics")
+    op.drop_index("ix_statistics_category", "statistics")
+    op.drop_column("statistics", "version")
@@ -1,11 +1,16 @@
 from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
+import json
 
+from app.core import cache, dashboards
 from app.core.deps import get_db, get_current_active_user
+from app.core.etag import conditional_response, json_response, make_etag
 from app.models.user import User
 from app.models.dashboard import DashboardConfig
-from app.schemas.dashboard import DashboardConfigCreate, DashboardConfigUpdate, DashboardConfig as DashboardConfigSchema
+from app.schemas.dashboard import DashboardConfigCreate, DashboardConfigUpdate, DashboardConfig as DashboardConfigSchema, DashboardData
+from app.worker import enqueue_dashboard_refresh
 
 router = APIRouter()
 
@@ -52,16 +57,26 @@ def create_dashboard_config(
     db.add(config)
     db.commit()
     db.refresh(config)
+    cache.invalidate(cache.default_dashboard_key(current_user.id))
+    
+    # Precalcular las series de los widgets en segundo plano
+    enqueue_dashboard_refresh(config.id)
     return config
 
 @router.get("/default", response_model=DashboardConfigSchema)
 def read_default_dashboard_config(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
     Get default dashboard configuration.
     """
+    key = cache.default_dashboard_key(current_user.id)
+    cached = cache.get_response(key)
+    if cached:
+        return json_response(request, cached.body, cached.etag, cached.last_modified)
+    
     config = db.query(DashboardConfig).filter(
         DashboardConfig.user_id == current_user.id,
         DashboardConfig.is_default == True
@@ -71,13 +86,19 @@ def read_default_dashboard_config(
             status_code=404,
             detail="No se encontró una configuración por defecto"
         )
-    return config
+    
+    etag = make_etag("dashboard", config.id, config.updated_at)
+    body = json.dumps(jsonable_encoder(DashboardConfigSchema.model_validate(config))).encode()
+    cache.set_response(key, etag, config.updated_at, body)
+    return json_response(request, body, etag, config.updated_at)
 
 @router.get("/{config_id}", response_model=DashboardConfigSchema)
 def read_dashboard_config(
     *,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
     config_id: int,
 ) -> Any:
     """
@@ -92,8 +113,44 @@ def read_dashboard_config(
             status_code=404,
             detail="Configuración no encontrada"
         )
+    
+    not_modified = conditional_response(
+        request, response, make_etag("dashboard", config.id, config.updated_at), config.updated_at
+    )
+    if not_modified:
+        return not_modified
     return config
 
+@router.get("/{config_id}/data", response_model=DashboardData)
+def read_dashboard_data(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    config_id: int,
+) -> Any:
+    """
+    Compute the data of every widget of a dashboard configuration in one call.
+    """
+    config = db.query(DashboardConfig).filter(
+        DashboardConfig.id == config_id,
+        DashboardConfig.user_id == current_user.id
+    ).first()
+    if not config:
+        raise HTTPException(
+            status_code=404,
+            detail="Configuración no encontrada"
+        )
+    
+    results, stale = dashboards.read_config_series(db, config)
+    if stale:
+        # Algunas series no estaban precalculadas o quedaron obsoletas
+        enqueue_dashboard_refresh(config.id)
+    
+    return {
+        "config_id": config.id,
+        "widgets": results,
+    }
+
 @router.put("/{config_id}", response_model=DashboardConfigSchema)
 def update_dashboard_config(
     *,
@@ -134,6 +191,11 @@ def update_dashboard_config(
     db.add(config)
     db.commit()
     db.refresh(config)
+    cache.invalidate(cache.default_dashboard_key(current_user.id))
+    
+    if "widgets" in update_data:
+        # Solo se recalculan los widgets cuya configuración cambió
+        enqueue_dashboard_refresh(config.id)
     return config
 
 @router.delete("/{config_id}")
@@ -164,4 +226,5 @@ def delete_dashboard_config(
     
     db.delete(config)
     db.commit()
+    cache.invalidate(cache.default_dashboard_key(current_user.id))
     return {"status": "success"} 
\ No newline at end of file
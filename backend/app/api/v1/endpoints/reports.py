@@ -1,29 +1,43 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
+from pathlib import Path
 import os
 
+from app.core.config import settings
 from app.core.deps import get_db, get_current_active_user
+from app.core.etag import conditional_response, make_etag
+from app.core.files import file_response
+from app.core.pagination import paginate
 from app.models.user import User
 from app.models.report import Report, ReportType
 from app.models.statistic import Statistic
-from app.schemas.report import ReportCreate, ReportUpdate, Report as ReportSchema
-from app.worker import generate_excel_report, generate_pdf_report
+from app.schemas.report import (
+    ReportCreate, ReportUpdate, Report as ReportSchema, ReportPage, ReportBatchRegenerate, ReportBatchJob
+)
+from app.worker import enqueue_report_generation, generate_reports_batch
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ReportSchema])
+MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+@router.get("/", response_model=ReportPage)
 def read_reports(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
-    skip: int = 0,
-    limit: int = 100,
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=1000),
 ) -> Any:
     """
     Retrieve reports.
     """
-    reports = db.query(Report).filter(Report.user_id == current_user.id).offset(skip).limit(limit).all()
-    return reports
+    reports, next_cursor = paginate(
+        db.query(Report).filter(Report.user_id == current_user.id), Report.id, cursor, limit
+    )
+    return {"items": reports, "next_cursor": next_cursor}
 
 @router.post("/", response_model=ReportSchema)
 async def create_report(
@@ -47,18 +61,43 @@ async def create_report(
     db.refresh(report)
     
     # Generar el reporte en segundo plano usando Celery
-    if report.type == ReportType.EXCEL:
-        generate_excel_report.delay(report.id)
-    elif report.type == ReportType.PDF:
-        generate_pdf_report.delay(report.id)
+    enqueue_report_generation(report.id, report.type)
     
     return report
 
+@router.post("/regenerate", response_model=ReportBatchJob, status_code=202)
+def regenerate_reports(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    batch_in: ReportBatchRegenerate,
+) -> Any:
+    """
+    Regenerate many reports in batched Celery tasks.
+    """
+    report_ids = [
+        row.id for row in db.query(Report.id).filter(
+            Report.id.in_(batch_in.report_ids),
+            Report.user_id == current_user.id,
+            Report.type.in_([ReportType.EXCEL, ReportType.PDF])
+        ).order_by(Report.id)
+    ]
+    
+    # Repartir los reportes en lotes para que varios workers los procesen
+    task_ids = []
+    for start in range(0, len(report_ids), settings.REPORT_BATCH_SIZE):
+        batch = report_ids[start:start + settings.REPORT_BATCH_SIZE]
+        task_ids.append(generate_reports_batch.delay(batch).id)
+    
+    return {"report_ids": report_ids, "task_ids": task_ids}
+
 @router.get("/{report_id}", response_model=ReportSchema)
 def read_report(
     *,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    request: Request,
+    response: Response,
     report_id: int,
 ) -> Any:
     """
@@ -73,8 +112,55 @@ def read_report(
             status_code=404,
             detail="Reporte no encontrado"
         )
+    
+    # La respuesta incluye las estadísticas del reporte, que pueden cambiar
+    # sin que cambie el updated_at del reporte
+    statistics = [(stat.id, stat.updated_at) for stat in report.statistics]
+    last_modified = max([report.updated_at] + [updated_at for _, updated_at in statistics])
+    not_modified = conditional_response(
+        request,
+        response,
+        make_etag("report", report.id, report.updated_at, report.file_path, statistics),
+        last_modified,
+    )
+    if not_modified:
+        return not_modified
     return report
 
+@router.get("/{report_id}/file")
+def download_report_file(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    report_id: int,
+) -> Any:
+    """
+    Download the generated file of a report (supports Range and conditional requests).
+    """
+    report = db.query(Report).filter(
+        Report.id == report_id,
+        Report.user_id == current_user.id
+    ).first()
+    if not report:
+        raise HTTPException(
+            status_code=404,
+            detail="Reporte no encontrado"
+        )
+    if not report.file_path or not os.path.exists(report.file_path):
+        raise HTTPException(
+            status_code=404,
+            detail="El archivo del reporte aún no está disponible"
+        )
+    
+    path = Path(report.file_path)
+    return file_response(
+        request,
+        path,
+        MEDIA_TYPES.get(path.suffix, "application/octet-stream"),
+        filename=f"reporte_{report.id}{path.suffix}",
+    )
+
 @router.put("/{report_id}", response_model=ReportSchema)
 def update_report(
     *,
@@ -113,10 +199,7 @@ def update_report(
     
     # Si el tipo cambió o no hay archivo, regenerar
     if not report.file_path:
-        if report.type == ReportType.EXCEL:
-            generate_excel_report.delay(report.id)
-        elif report.type == ReportType.PDF:
-            generate_pdf_report.delay(report.id)
+        enqueue_report_generation(report.id, report.type)
     
     return report
 
@@ -179,10 +262,7 @@ def add_statistic_to_report(
     report.statistics.append(statistic)
     db.commit()
     
-    # Regenerar el reporte con la nueva estadística
-    if report.type == ReportType.EXCEL:
-        generate_excel_report.delay(report.id)
-    elif report.type == ReportType.PDF:
-        generate_pdf_report.delay(report.id)
+    # Regenerar el reporte con la nueva estadística (las solicitudes seguidas se agrupan)
+    enqueue_report_generation(report.id, report.type)
     
     return {"status": "success"} 
\ No newline at end of file
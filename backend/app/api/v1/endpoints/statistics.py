@@ -1,31 +1,176 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from pathlib import Path
 import pandas as pd
 import json
+import shutil
+import uuid
+import zipfile
 
-from app.core.deps import get_db, get_current_active_user
+from app.core import cache, ingest, query, storage
+from app.core.config import settings
+from app.core.deps import get_async_db, get_db, get_current_active_user
+from app.core.etag import is_not_modified, json_response, make_etag, validator_headers
+from app.core.export import ExportFormat, MEDIA_TYPES as EXPORT_MEDIA_TYPES, iter_export, sheet_title
+from app.core.pagination import paginate
 from app.models.user import User
-from app.models.statistic import Statistic
-from app.schemas.statistic import StatisticCreate, StatisticUpdate, Statistic as StatisticSchema
+from app.models.job import IngestJob, JobStatus
+from app.models.report import Report
+from app.models.statistic import ReportStatistic, Statistic, StatisticVersion, VersionChange
+from app.schemas.job import IngestBatch as IngestBatchSchema, IngestJob as IngestJobSchema
+from app.schemas.statistic import StatisticCreate, StatisticUpdate, Statistic as StatisticSchema, StatisticDiff, StatisticQueryResult, StatisticRows, StatisticRowsAppend, StatisticRowsChange, StatisticRowsUpsert, StatisticList, StatisticVersion as StatisticVersionSchema
+from app.worker import compact_statistic, enqueue_report_generation, ingest_statistic, ingest_statistics_batch, refresh_statistic_series
 
 router = APIRouter()
 
-@router.get("/", response_model=List[StatisticSchema])
+UNSUPPORTED_FILE_DETAIL = "El archivo debe ser Excel (.xls o .xlsx), CSV (.csv) o Parquet (.parquet)"
+
+def save_incoming(file: Any, filename: str) -> Path:
+    """
+    Guardar una copia del archivo subido para que el worker lo procese
+    """
+    incoming_dir = Path(settings.UPLOAD_DIR) / "incoming"
+    incoming_dir.mkdir(parents=True, exist_ok=True)
+    file_path = incoming_dir / f"{uuid.uuid4().hex}{Path(filename).suffix}"
+    with open(file_path, "wb") as out:
+        shutil.copyfileobj(file, out, length=1024 * 1024)
+    return file_path
+
+def serialize_statistic(statistic: Statistic, version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Armar la respuesta de una estadística con sus datos leídos desde el
+    almacenamiento columnar, de la versión vigente o de una anterior
+    """
+    version = version or statistic.version
+    df = storage.read_statistic_data(statistic.id, version)
+    metadata = statistic.metadata
+    if version != statistic.version:
+        metadata = {
+            **(metadata or {}),
+            "columns": [str(column) for column in df.columns],
+            "rows": len(df),
+            "schema": storage.read_statistic_schema(statistic.id, version),
+        }
+    return {
+        "id": statistic.id,
+        "title": statistic.title,
+        "description": statistic.description,
+        "category": statistic.category,
+        "data": storage.dataframe_to_columns(df),
+        "source_file": statistic.source_file,
+        "metadata": metadata,
+        "version": version,
+        "created_at": statistic.created_at,
+        "updated_at": statistic.updated_at,
+    }
+
+def commit_data_version(
+    db: Session, statistic: Statistic, summary: Dict[str, Any], change: VersionChange, user_id: int
+) -> None:
+    """
+    Registrar una nueva versión de los datos en el historial e invalidar solo
+    lo que depende de esta estadística: su caché, las series de los dashboards
+    que la usan y los reportes ya generados que la incluyen. La versión
+    anterior se conserva.
+    """
+    statistic.version = summary["version"]
+    statistic.data = summary
+    statistic.metadata = {
+        **(statistic.metadata or {}),
+        "columns": summary["columns"],
+        "rows": summary["rows"],
+        "schema": storage.read_statistic_schema(statistic.id, statistic.version),
+    }
+    db.add(statistic)
+    db.add(StatisticVersion(
+        statistic_id=statistic.id,
+        version=statistic.version,
+        change=change,
+        data=summary,
+        user_id=user_id
+    ))
+    db.commit()
+    db.refresh(statistic)
+    cache.invalidate(cache.statistic_key(statistic.id))
+    
+    refresh_statistic_series.delay(statistic.id)
+    reports = db.query(Report.id, Report.type).join(
+        ReportStatistic, ReportStatistic.report_id == Report.id
+    ).filter(
+        ReportStatistic.statistic_id == statistic.id,
+        Report.file_path.isnot(None)
+    ).all()
+    for report in reports:
+        enqueue_report_generation(report.id, report.type)
+    if storage.needs_compaction(summary):
+        compact_statistic.delay(statistic.id)
+
+def check_version(statistic: Statistic, version: int) -> None:
+    if version > statistic.version or not storage.version_exists(statistic.id, version):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Versión {version} no encontrada"
+        )
+
+def rows_frame(data: Dict[str, List[Any]]) -> pd.DataFrame:
+    try:
+        return pd.DataFrame(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Datos inválidos: {e}")
+
+def lock_statistic(db: Session, statistic_id: int) -> Statistic:
+    """
+    Estadística con su fila bloqueada hasta el commit, para que dos cambios
+    de datos simultáneos no partan de la misma versión
+    """
+    statistic = db.query(Statistic).filter(Statistic.id == statistic_id).with_for_update().first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    return statistic
+
+@router.get("/", response_model=StatisticList)
 def read_statistics(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
-    skip: int = 0,
-    limit: int = 100,
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+    category: str = None,
+    source_file: str = None,
 ) -> Any:
     """
-    Retrieve statistics.
+    Retrieve statistics (summary fields only, without data).
     """
-    statistics = db.query(Statistic).offset(skip).limit(limit).all()
-    return statistics
+    statistics_query = db.query(Statistic)
+    if category is not None:
+        statistics_query = statistics_query.filter(Statistic.category == category)
+    if source_file is not None:
+        statistics_query = statistics_query.filter(Statistic.source_file == source_file)
+    
+    total = statistics_query.count()
+    # Solo se cargan las columnas del listado; data y metadata nunca se leen
+    statistics_query = statistics_query.options(load_only(
+        Statistic.id,
+        Statistic.title,
+        Statistic.description,
+        Statistic.category,
+        Statistic.source_file,
+        Statistic.version,
+        Statistic.created_at,
+        Statistic.updated_at,
+    ))
+    statistics, next_cursor = paginate(statistics_query, Statistic.id, cursor, limit)
+    return {"total": total, "items": statistics, "next_cursor": next_cursor}
 
-@router.post("/upload", response_model=StatisticSchema)
-async def create_statistic_from_excel(
+@router.post("/upload", response_model=IngestJobSchema, status_code=202)
+def create_statistic_from_excel(
     *,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
@@ -35,67 +180,219 @@ async def create_statistic_from_excel(
     category: str,
 ) -> Any:
     """
-    Create new statistic from Excel file.
+    Create new statistic from an Excel, CSV or Parquet file.
+    
+    The file is processed by a Celery worker; poll /statistics/jobs/{job_id} for progress.
     """
-    if not file.filename.endswith(('.xls', '.xlsx')):
+    if not ingest.is_supported(file.filename):
         raise HTTPException(
             status_code=400,
-            detail="El archivo debe ser un archivo Excel (.xls o .xlsx)"
+            detail=UNSUPPORTED_FILE_DETAIL
         )
     
-    try:
-        df = pd.read_excel(file.file)
-        data = df.to_dict(orient='records')
-        
-        statistic = Statistic(
-            title=title,
+    file_path = save_incoming(file.file, file.filename)
+    
+    job = IngestJob(
+        status=JobStatus.PENDING,
+        file_path=str(file_path),
+        source_file=file.filename,
+        title=title,
+        description=description,
+        category=category,
+        total_bytes=file_path.stat().st_size,
+        user_id=current_user.id
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    
+    # Procesar la planilla en segundo plano usando Celery
+    ingest_statistic.delay(job.id)
+    
+    return job
+
+@router.post("/upload/bulk", response_model=IngestBatchSchema, status_code=202)
+def create_statistics_from_files(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    files: List[UploadFile] = File(...),
+    description: str = None,
+    category: str,
+) -> Any:
+    """
+    Create many statistics from Excel, CSV or Parquet files and/or zip archives of them.
+    
+    Each spreadsheet becomes a statistic titled after its file name. The files are
+    parsed in parallel by a Celery worker; poll /statistics/batches/{batch_id} for
+    the outcome of each file.
+    """
+    batch_id = uuid.uuid4().hex
+    jobs: List[IngestJob] = []
+    
+    def add_job(filename: str, file_path: Path = None, error: str = None) -> None:
+        jobs.append(IngestJob(
+            status=JobStatus.FAILED if error else JobStatus.PENDING,
+            file_path=str(file_path) if file_path else "",
+            source_file=filename,
+            title=Path(filename).stem,
             description=description,
             category=category,
-            data=data,
-            source_file=file.filename,
-            metadata={
-                "columns": list(df.columns),
-                "rows": len(df)
-            }
-        )
-        db.add(statistic)
-        db.commit()
-        db.refresh(statistic)
-        return statistic
-    except Exception as e:
+            total_bytes=file_path.stat().st_size if file_path else 0,
+            error=error,
+            batch_id=batch_id,
+            user_id=current_user.id
+        ))
+    
+    for file in files:
+        if file.filename.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(file.file) as archive:
+                    # El zip solo se lee hasta el tamaño declarado de cada archivo,
+                    # así que basta con revisar esos tamaños antes de extraer
+                    extracted = 0
+                    for info in archive.infolist():
+                        name = Path(info.filename).name
+                        if info.is_dir() or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                            continue
+                        if not ingest.is_supported(name):
+                            add_job(name, error=UNSUPPORTED_FILE_DETAIL)
+                            continue
+                        if info.file_size > settings.INGEST_MAX_ZIP_ENTRY_BYTES:
+                            add_job(name, error="El archivo descomprimido supera el tamaño máximo permitido")
+                            continue
+                        if extracted + info.file_size > settings.INGEST_MAX_ZIP_BYTES:
+                            add_job(name, error="El zip descomprimido supera el tamaño máximo permitido")
+                            continue
+                        extracted += info.file_size
+                        with archive.open(info) as entry:
+                            add_job(name, save_incoming(entry, name))
+            except zipfile.BadZipFile:
+                add_job(file.filename, error="Archivo zip inválido")
+        elif ingest.is_supported(file.filename):
+            add_job(file.filename, save_incoming(file.file, file.filename))
+        else:
+            add_job(file.filename, error=UNSUPPORTED_FILE_DETAIL)
+    
+    if not jobs:
         raise HTTPException(
             status_code=400,
-            detail=f"Error al procesar el archivo: {str(e)}"
+            detail="No se encontraron archivos para cargar"
+        )
+    
+    db.add_all(jobs)
+    db.commit()
+    
+    # Procesar todas las planillas en segundo plano en una sola tarea de Celery
+    if any(job.status == JobStatus.PENDING for job in jobs):
+        ingest_statistics_batch.delay(batch_id)
+    
+    return {
+        "batch_id": batch_id,
+        "jobs": db.query(IngestJob).filter(IngestJob.batch_id == batch_id).order_by(IngestJob.id).all(),
+    }
+
+@router.get("/batches/{batch_id}", response_model=IngestBatchSchema)
+async def read_ingest_batch(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+    batch_id: str,
+) -> Any:
+    """
+    Get the status and outcome of every file in a bulk upload.
+    """
+    result = await db.execute(select(IngestJob).filter(
+        IngestJob.batch_id == batch_id,
+        IngestJob.user_id == current_user.id
+    ).order_by(IngestJob.id))
+    jobs = result.scalars().all()
+    if not jobs:
+        raise HTTPException(
+            status_code=404,
+            detail="Carga masiva no encontrada"
+        )
+    return {"batch_id": batch_id, "jobs": jobs}
+
+@router.get("/jobs/{job_id}", response_model=IngestJobSchema)
+async def read_ingest_job(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+    job_id: int,
+) -> Any:
+    """
+    Get the status and progress of an upload job.
+    """
+    # Endpoint consultado constantemente mientras dura la carga: usa el engine asíncrono
+    result = await db.execute(select(IngestJob).filter(
+        IngestJob.id == job_id,
+        IngestJob.user_id == current_user.id
+    ))
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Trabajo de carga no encontrado"
         )
+    return job
 
 @router.get("/{statistic_id}", response_model=StatisticSchema)
 def read_statistic(
     *,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    request: Request,
     statistic_id: int,
+    version: int = Query(None, ge=1),
 ) -> Any:
     """
-    Get specific statistic by ID.
+    Get specific statistic by ID, optionally at a previous version of its data.
     """
+    # Las estadísticas más consultadas se sirven ya serializadas desde la caché
+    key = cache.statistic_key(statistic_id)
+    if version is None:
+        cached = cache.get_response(key)
+        if cached:
+            return json_response(request, cached.body, cached.etag, cached.last_modified)
+    
     statistic = db.query(Statistic).filter(Statistic.id == statistic_id).first()
     if not statistic:
         raise HTTPException(
             status_code=404,
             detail="Estadística no encontrada"
         )
-    return statistic
+    
+    if version is not None and version != statistic.version:
+        # Las versiones anteriores se leen directo de sus segmentos; no pasan por la caché compartida
+        check_version(statistic, version)
+        etag = make_etag("statistic", statistic.id, version, statistic.updated_at)
+        if is_not_modified(request, etag, statistic.updated_at):
+            return Response(status_code=304, headers=validator_headers(etag, statistic.updated_at))
+        body = json.dumps(jsonable_encoder(serialize_statistic(statistic, version))).encode()
+        return json_response(request, body, etag, statistic.updated_at)
+    
+    # Si el cliente ya tiene esta versión no se leen los datos
+    etag = make_etag("statistic", statistic.id, statistic.version, statistic.updated_at)
+    if is_not_modified(request, etag, statistic.updated_at):
+        return Response(status_code=304, headers=validator_headers(etag, statistic.updated_at))
+    
+    body = json.dumps(jsonable_encoder(serialize_statistic(statistic))).encode()
+    cache.set_response(key, etag, statistic.updated_at, body)
+    return json_response(request, body, etag, statistic.updated_at)
 
-@router.put("/{statistic_id}", response_model=StatisticSchema)
-def update_statistic(
+@router.get("/{statistic_id}/rows", response_model=StatisticRows)
+def read_statistic_rows(
     *,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     statistic_id: int,
-    statistic_in: StatisticUpdate,
+    columns: List[str] = Query([]),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000),
 ) -> Any:
     """
-    Update a statistic.
+    Get a range of rows of a statistic, optionally projected to some columns.
     """
     statistic = db.query(Statistic).filter(Statistic.id == statistic_id).first()
     if not statistic:
@@ -104,14 +401,326 @@ def update_statistic(
             detail="Estadística no encontrada"
         )
     
+    available = statistic.data.get("columns", [])
+    missing = set(columns) - set(available)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Columnas inexistentes: {', '.join(sorted(missing))}"
+        )
+    
+    df = storage.read_statistic_rows(
+        statistic.id, statistic.version, offset, limit, columns or None
+    )
+    return {
+        "statistic_id": statistic.id,
+        "version": statistic.version,
+        "offset": offset,
+        "limit": limit,
+        "total_rows": statistic.data.get("rows", 0),
+        "columns": columns or available,
+        "data": storage.dataframe_to_columns(df),
+    }
+
+@router.post("/{statistic_id}/rows", response_model=StatisticRowsChange)
+def append_statistic_rows(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    rows_in: StatisticRowsAppend,
+) -> Any:
+    """
+    Append rows to a statistic.
+    
+    Only the new rows are written; the new version shares the existing rows with the previous one.
+    """
+    statistic = lock_statistic(db, statistic_id)
+    df = rows_frame(rows_in.data)
+    if df.empty:
+        db.rollback()
+        return {"statistic_id": statistic.id, "version": statistic.version, "rows": statistic.data.get("rows", 0)}
+    
+    try:
+        summary = storage.append_statistic_rows(statistic.id, statistic.version, statistic.version + 1, df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    commit_data_version(db, statistic, summary, VersionChange.APPEND, current_user.id)
+    return {
+        "statistic_id": statistic.id,
+        "version": statistic.version,
+        "rows": summary["rows"],
+        "inserted": len(df),
+    }
+
+@router.post("/{statistic_id}/rows/upsert", response_model=StatisticRowsChange)
+def upsert_statistic_rows(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    rows_in: StatisticRowsUpsert,
+) -> Any:
+    """
+    Insert or replace rows of a statistic matched by the key columns.
+    
+    Rows identical to the stored ones are skipped; if nothing changes no new version is created.
+    Columns missing from the request are left empty in the replaced rows.
+    """
+    if not rows_in.key:
+        raise HTTPException(status_code=400, detail="Debe indicar las columnas clave")
+    statistic = lock_statistic(db, statistic_id)
+    df = rows_frame(rows_in.data)
+    
+    summary = None
+    counts = {}
+    if not df.empty:
+        try:
+            summary, counts = storage.upsert_statistic_rows(
+                statistic.id, statistic.version, statistic.version + 1, df, rows_in.key
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if summary is None:
+        db.rollback()
+        return {
+            "statistic_id": statistic.id,
+            "version": statistic.version,
+            "rows": statistic.data.get("rows", 0),
+            **counts,
+        }
+    commit_data_version(db, statistic, summary, VersionChange.UPSERT, current_user.id)
+    return {
+        "statistic_id": statistic.id,
+        "version": statistic.version,
+        "rows": summary["rows"],
+        **counts,
+    }
+
+@router.post("/{statistic_id}/compact", status_code=202)
+def compact_statistic_data(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+) -> Any:
+    """
+    Rewrite the current version of a statistic as full-size segments in the background.
+    """
+    statistic = db.query(Statistic.id).filter(Statistic.id == statistic_id).first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    compact_statistic.delay(statistic_id)
+    return {"status": "queued"}
+
+@router.get("/{statistic_id}/versions", response_model=List[StatisticVersionSchema])
+def read_statistic_versions(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+) -> Any:
+    """
+    List the recorded versions of a statistic's data, newest first.
+    
+    Any of them can be read with GET /statistics/{id}?version= or compared with /statistics/{id}/diff.
+    """
+    statistic = db.query(Statistic.id).filter(Statistic.id == statistic_id).first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    versions = db.query(StatisticVersion).filter(
+        StatisticVersion.statistic_id == statistic_id
+    ).order_by(StatisticVersion.version.desc()).all()
+    return [
+        {
+            "version": version.version,
+            "change": version.change,
+            "rows": version.data.get("rows", 0),
+            "columns": version.data.get("columns", []),
+            "user_id": version.user_id,
+            "created_at": version.created_at,
+        }
+        for version in versions
+    ]
+
+@router.get("/{statistic_id}/diff", response_model=StatisticDiff)
+def diff_statistic_versions(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    from_version: int = Query(..., ge=1),
+    to_version: int = Query(None, ge=1),
+    key: List[str] = Query([]),
+    limit: int = Query(1000, ge=1, le=10000),
+) -> Any:
+    """
+    Compare two versions of a statistic's data (to_version defaults to the current one).
+    
+    Without key columns whole rows are compared and only added and removed rows are
+    reported. With key columns, rows whose key exists in both versions but whose values
+    differ are reported as changed, with their previous values in "previous".
+    Each list is truncated to `limit` rows; "rows" has the full count.
+    """
+    statistic = db.query(Statistic).filter(Statistic.id == statistic_id).first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    to_version = to_version or statistic.version
+    check_version(statistic, from_version)
+    check_version(statistic, to_version)
+    
+    try:
+        diff = storage.diff_statistic_versions(statistic.id, from_version, to_version, key or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def diff_rows(df: pd.DataFrame) -> Dict[str, Any]:
+        return {"rows": len(df), "data": storage.dataframe_to_columns(df.head(limit))}
+    
+    return {
+        "statistic_id": statistic.id,
+        "from_version": from_version,
+        "to_version": to_version,
+        "key": key,
+        "columns_added": diff["columns_added"],
+        "columns_removed": diff["columns_removed"],
+        "added": diff_rows(diff["added"]),
+        "removed": diff_rows(diff["removed"]),
+        "changed": diff_rows(diff["changed"]),
+        "previous": diff_rows(diff["previous"]),
+    }
+
+@router.get("/{statistic_id}/export")
+def export_statistic(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    format: ExportFormat = ExportFormat.CSV,
+) -> Any:
+    """
+    Export the data of a statistic as CSV, Parquet or XLSX, streamed in chunks.
+    """
+    statistic = db.query(Statistic).filter(Statistic.id == statistic_id).first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    
+    filename = f"estadistica_{statistic.id}_v{statistic.version}.{format.value}"
+    return StreamingResponse(
+        iter_export(
+            format,
+            statistic.id,
+            statistic.version,
+            statistic.data.get("columns", []),
+            sheet_title(statistic.title, set()),
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/{statistic_id}/query", response_model=StatisticQueryResult)
+def query_statistic(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    group_by: List[str] = Query([]),
+    agg: List[str] = Query([]),
+    filter: List[str] = Query([]),
+    sort: List[str] = Query([]),
+    limit: int = Query(None, ge=1),
+) -> Any:
+    """
+    Aggregate a statistic's rows on the server. At least one group_by or agg is required.
+    
+    - group_by: columns to group by
+    - agg: "column:func" with func in sum, mean, count, min, max ("*:count" counts rows)
+    - filter: "column:op:value" with op in eq, ne, gt, gte, lt, lte, in, contains
+    - sort: "column" for ascending, "-column" for descending
+    """
+    statistic = db.query(Statistic).filter(Statistic.id == statistic_id).first()
+    if not statistic:
+        raise HTTPException(
+            status_code=404,
+            detail="Estadística no encontrada"
+        )
+    
+    try:
+        aggregations = query.parse_aggregations(agg)
+        filters = query.parse_filters(filter)
+        sorting = query.parse_sort(sort)
+        
+        # Leer solo las columnas que participan en la consulta
+        columns = query.referenced_columns(group_by, aggregations, filters)
+        missing = columns - set(statistic.data.get("columns", []))
+        if missing:
+            raise ValueError(f"Columnas inexistentes: {', '.join(sorted(missing))}")
+        df = storage.read_statistic_data(statistic.id, statistic.version, sorted(columns))
+        
+        result = query.run_query(df, group_by, aggregations, filters, sorting, limit)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Consulta inválida: {str(e)}"
+        )
+    
+    return {
+        "statistic_id": statistic.id,
+        "version": statistic.version,
+        "columns": [str(column) for column in result.columns],
+        "rows": len(result),
+        "data": storage.dataframe_to_columns(result),
+    }
+
+@router.put("/{statistic_id}", response_model=StatisticSchema)
+def update_statistic(
+    *,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    statistic_id: int,
+    statistic_in: StatisticUpdate,
+) -> Any:
+    """
+    Update a statistic.
+    """
+    statistic = lock_statistic(db, statistic_id)
+    
     update_data = statistic_in.dict(exclude_unset=True)
+    data = update_data.pop("data", None)
+    df = rows_frame(data) if data is not None else None
+    
     for field, value in update_data.items():
         setattr(statistic, field, value)
     
-    db.add(statistic)
-    db.commit()
-    db.refresh(statistic)
-    return statistic
+    if df is None:
+        db.add(statistic)
+        db.commit()
+        db.refresh(statistic)
+        cache.invalidate(cache.statistic_key(statistic.id))
+        return serialize_statistic(statistic)
+    
+    # Los nuevos datos se escriben como una nueva versión; la anterior se conserva
+    # y comparte con ella los segmentos que no cambian
+    try:
+        summary = storage.write_statistic_chunks(statistic.id, statistic.version + 1, [df])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Datos inválidos: {e}")
+    commit_data_version(db, statistic, summary, VersionChange.UPDATE, current_user.id)
+    return serialize_statistic(statistic)
 
 @router.delete("/{statistic_id}")
 def delete_statistic(
@@ -132,4 +741,6 @@ def delete_statistic(
     
     db.delete(statistic)
     db.commit()
+    cache.invalidate(cache.statistic_key(statistic_id))
+    storage.delete_statistic_data(statistic_id)
     return {"status": "success"} 
\ No newline at end of file
@@ -1,26 +1,28 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
+from app.core import cache
 from app.core.deps import get_db, get_current_admin_user
+from app.core.pagination import paginate
 from app.models.user import User
-from app.schemas.auth import User as UserSchema, UserCreate, UserUpdate
+from app.schemas.auth import User as UserSchema, UserCreate, UserUpdate, UserPage
 from app.core import security
 
 router = APIRouter()
 
-@router.get("/", response_model=List[UserSchema])
+@router.get("/", response_model=UserPage)
 def read_users(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin_user),
-    skip: int = 0,
-    limit: int = 100,
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=1000),
 ) -> Any:
     """
     Retrieve users.
     """
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    users, next_cursor = paginate(db.query(User), User.id, cursor, limit)
+    return {"items": users, "next_cursor": next_cursor}
 
 @router.post("/", response_model=UserSchema)
 def create_user(
@@ -72,12 +74,15 @@ def update_user(
     if "password" in update_data:
         update_data["hashed_password"] = security.get_password_hash(update_data.pop("password"))
     
+    previous_email = user.email
     for field, value in update_data.items():
         setattr(user, field, value)
     
     db.add(user)
     db.commit()
     db.refresh(user)
+    # Invalidar el principal en caché para que los cambios (p. ej. desactivación) rijan de inmediato
+    cache.invalidate(cache.principal_key(previous_email), cache.principal_key(user.email))
     return user
 
 @router.delete("/{user_id}")
@@ -104,4 +109,5 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    cache.invalidate(cache.principal_key(user.email))
     return {"status": "success"} 
\ No newline at end of file
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import Any, Callable
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from app.core.config import settings
+
+ARTIFACTS_DIR = Path(settings.UPLOAD_DIR) / "reports" / "artifacts"
+
+def report_fingerprint(report: Any, **options: Any) -> str:
+    """
+    Hash de todo lo que determina el archivo de un reporte: tipo, título,
+    descripción, las estadísticas incluidas con su updated_at y versión de
+    datos, y las opciones de generación
+    """
+    content = {
+        "type": report.type.value if hasattr(report.type, "value") else report.type,
+        "title": report.title,
+        "description": report.description,
+        "statistics": sorted(
+            [stat.id, stat.version, stat.updated_at.isoformat() if stat.updated_at else None]
+            for stat in report.statistics
+        ),
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def artifact_path(fingerprint: str, extension: str) -> Path:
+    return ARTIFACTS_DIR / f"{fingerprint}.{extension}"
+
+def link_artifact(artifact: Path, target: Path) -> None:
+    """
+    Publicar un artefacto en la ruta del reporte con un hard link (copia si
+    el sistema de archivos no lo permite). Borrar el reporte no borra el artefacto.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_target = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+    try:
+        os.link(artifact, tmp_target)
+    except OSError:
+        shutil.copy2(artifact, tmp_target)
+    tmp_target.replace(target)
+
+def get_or_render(fingerprint: str, extension: str, render: Callable[[str], None]) -> Path:
+    """
+    Retornar el artefacto para este contenido, generándolo solo si no existe.
+    Después de generar uno nuevo se eliminan los artefactos que ya no se usan.
+    """
+    artifact = artifact_path(fingerprint, extension)
+    try:
+        # Al reusarlo se renueva su ctime para que no se elimine antes de
+        # enlazarlo. Se conservan atime y mtime: el mtime es el Last-Modified
+        # y el ETag de todos los reportes enlazados a este archivo.
+        stat = artifact.stat()
+        os.utime(artifact, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return artifact
+    except FileNotFoundError:
+        pass
+
+    ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = ARTIFACTS_DIR / f".{fingerprint}.{uuid.uuid4().hex}.{extension}"
+    try:
+        render(str(tmp_path))
+        tmp_path.replace(artifact)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    prune_artifacts()
+    return artifact
+
+def prune_artifacts() -> None:
+    """
+    Eliminar los artefactos que ningún reporte publica (el único enlace es el
+    del directorio de artefactos) y los temporales de generaciones interrumpidas.
+    st_ctime cambia al crear o borrar un enlace, así que mide cuánto tiempo
+    lleva el artefacto sin reportes; los recientes se conservan para reusarlos.
+    """
+    if not ARTIFACTS_DIR.exists():
+        return
+    threshold = time.time() - settings.REPORT_ARTIFACT_MAX_AGE_SECONDS
+    for path in ARTIFACTS_DIR.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_nlink == 1 and stat.st_ctime < threshold:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+import json
+import logging
+import threading
+import time
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class LocalCache:
+    """
+    Caché en memoria del proceso, LRU con límite total de bytes y TTL por entrada.
+    Se usa cuando Redis no está disponible y en las pruebas. Con max_ttl el
+    TTL de cada entrada se acorta a ese valor: las invalidaciones de otros
+    procesos no llegan a esta caché, así que sus entradas deben vivir poco.
+    """
+    def __init__(self, max_bytes: int, max_ttl: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        if self.max_ttl is not None:
+            ttl = min(ttl, self.max_ttl)
+        if len(value) > self.max_bytes or ttl <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._size += len(value)
+            # Desalojar las entradas menos usadas hasta volver al límite de bytes
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+class RedisCache:
+    """
+    Caché en Redis. Si Redis falla, las operaciones pasan a la caché local;
+    las entradas que queden en Redis expiran por su TTL.
+    """
+    def __init__(self, client: redis.Redis, fallback: LocalCache):
+        self.client = client
+        self.fallback = fallback
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(key)
+        except redis.RedisError:
+            logger.warning("Redis no disponible, usando caché local")
+            return self.fallback.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        try:
+            self.client.set(key, value, ex=ttl)
+        except redis.RedisError:
+            self.fallback.set(key, value, ttl)
+
+    def delete(self, *keys: str) -> None:
+        self.fallback.delete(*keys)
+        try:
+            self.client.delete(*keys)
+        except redis.RedisError:
+            logger.warning("No se pudieron invalidar las claves %s en Redis", keys)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Any:
+    """
+    Caché compartida: Redis si responde, si no la caché local
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                fallback = LocalCache(settings.CACHE_LOCAL_MAX_BYTES, settings.CACHE_LOCAL_TTL_SECONDS)
+                client = redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.CACHE_REDIS_DB,
+                    socket_timeout=0.5,
+                    socket_connect_timeout=0.5,
+                )
+                try:
+                    client.ping()
+                    _cache = RedisCache(client, fallback)
+                except redis.RedisError:
+                    logger.warning("Redis no disponible, usando caché local")
+                    _cache = fallback
+    return _cache
+
+def set_cache(cache: Any) -> None:
+    """
+    Reemplazar la caché compartida (por ejemplo, por una caché local en las pruebas)
+    """
+    global _cache
+    _cache = cache
+
+def statistic_key(statistic_id: int) -> str:
+    return f"statistic:{statistic_id}"
+
+def default_dashboard_key(user_id: int) -> str:
+    return f"dashboard:default:{user_id}"
+
+def principal_key(email: str) -> str:
+    return f"principal:{email}"
+
+class CachedResponse(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+    body: bytes
+
+def get_response(key: str) -> Optional[CachedResponse]:
+    """
+    Leer una respuesta serializada junto con su ETag
+    """
+    value = get_cache().get(key)
+    if value is None:
+        return None
+    header, _, body = value.partition(b"\n")
+    meta = json.loads(header)
+    last_modified = meta.get("last_modified")
+    return CachedResponse(
+        meta["etag"],
+        datetime.fromisoformat(last_modified) if last_modified else None,
+        body,
+    )
+
+def set_response(key: str, etag: str, last_modified: Optional[datetime], body: bytes) -> None:
+    """
+    Guardar una respuesta ya serializada; las entradas más grandes que
+    CACHE_MAX_ENTRY_BYTES no se guardan
+    """
+    if len(body) > settings.CACHE_MAX_ENTRY_BYTES:
+        return
+    header = json.dumps({
+        "etag": etag,
+        "last_modified": last_modified.isoformat() if last_modified else None,
+    }).encode()
+    get_cache().set(key, header + b"\n" + body, settings.CACHE_TTL_SECONDS)
+
+def invalidate(*keys: str) -> None:
+    get_cache().delete(*keys)
@@ -7,10 +7,28 @@ celery_app = Celery(
     backend=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/0"
 )
 
-celery_app.conf.task_routes = {
+# Todas las tareas van a main-queue. Con POOL_QUEUE definido, las que pueden
+# usar un pool de procesos (carga masiva y PDF) van a esa cola, que se
+# atiende con un worker de concurrencia 1 (ver README)
+POOL_TASKS = (
+    "app.worker.generate_pdf_report",
+    "app.worker.generate_reports_batch",
+    "app.worker.ingest_statistics_batch",
+)
+
+task_routes = {
     "app.worker.generate_excel_report": "main-queue",
-    "app.worker.generate_pdf_report": "main-queue"
+    "app.worker.generate_pdf_report": "main-queue",
+    "app.worker.generate_reports_batch": "main-queue",
+    "app.worker.ingest_statistic": "main-queue",
+    "app.worker.ingest_statistics_batch": "main-queue",
+    "app.worker.compact_statistic": "main-queue",
+    "app.worker.refresh_dashboard_series": "main-queue",
+    "app.worker.refresh_statistic_series": "main-queue",
 }
+if settings.POOL_QUEUE:
+    task_routes.update(dict.fromkeys(POOL_TASKS, settings.POOL_QUEUE))
+celery_app.conf.task_routes = task_routes
 
 celery_app.conf.update(
     task_serializer="json",
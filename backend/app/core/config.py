@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from sqlalchemy.engine import make_url
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -12,6 +13,17 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     DATABASE_URL: Optional[str] = None
+    ASYNC_DATABASE_URL: Optional[str] = None
+    
+    # Pool de conexiones (se aplica al engine síncrono y al asíncrono)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30  # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # Segundos antes de reciclar una conexión
+    DB_POOL_PRE_PING: bool = True
+    
+    # Hilos para endpoints y dependencias síncronas (el valor por defecto de AnyIO es 40)
+    THREADPOOL_SIZE: int = 100
     
     # Security
     SECRET_KEY: str
@@ -22,8 +34,42 @@ class Settings(BaseSettings):
     REDIS_HOST: str
     REDIS_PORT: int
     
+    # Celery
+    POOL_QUEUE: Optional[str] = None  # Cola para las tareas que usan PDF_WORKERS o INGEST_WORKERS; None = main-queue
+    
+    # Caché de respuestas
+    CACHE_REDIS_DB: int = 1
+    CACHE_TTL_SECONDS: int = 300
+    CACHE_MAX_ENTRY_BYTES: int = 5 * 1024 * 1024  # Respuestas más grandes no se guardan
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024  # Límite de la caché local en memoria
+    CACHE_LOCAL_TTL_SECONDS: int = 5  # TTL máximo en la caché local, que no recibe invalidaciones de otros procesos (0 = no guardar)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60  # Tiempo máximo que un usuario desactivado sigue autenticado
+    
+    # Dashboards
+    DASHBOARD_WORKERS: int = 8  # Hilos para calcular los widgets de un dashboard
+    DASHBOARD_REFRESH_DEBOUNCE_SECONDS: int = 5  # Espera para agrupar solicitudes de recálculo de series
+    
+    # Reportes
+    REPORT_DEBOUNCE_SECONDS: int = 5  # Espera para agrupar solicitudes de regeneración
+    REPORT_LOCK_TIMEOUT: int = 600  # Duración máxima del lock de generación por reporte
+    REPORT_BATCH_SIZE: int = 50  # Reportes por tarea en la regeneración masiva
+    REPORT_ARTIFACT_MAX_AGE_SECONDS: int = 7 * 24 * 3600  # Tiempo que se conserva un artefacto sin reportes
+    PDF_WORKERS: int = 0  # Procesos para renderizar las tablas de un PDF (0 = en serie); requiere POOL_QUEUE
+    PDF_TABLE_POLICY: str = "paginate"  # Tablas grandes: paginate (todas las filas), truncate o summarize
+    PDF_TABLE_MAX_ROWS: int = 500  # Filas por tabla antes de aplicar la política
+    
+    # Estadísticas
+    STATISTIC_MAX_SEGMENTS: int = 20  # Segmentos agregados por versión, además de los completos, antes de compactar
+    STATISTIC_MAX_DELETED_RATIO: float = 0.2  # Proporción de filas reemplazadas antes de compactar
+    
     # File Upload
     UPLOAD_DIR: str = "uploads"
+    FILES_ACCEL_REDIRECT_LOCATION: Optional[str] = None  # Location interna de nginx que sirve UPLOAD_DIR (X-Accel-Redirect)
+    INGEST_CHUNK_SIZE: int = 10000  # Filas por bloque al leer planillas
+    INGEST_CSV_BLOCK_SIZE: int = 16 * 1024 * 1024  # Bytes por bloque al leer CSV
+    INGEST_WORKERS: int = 0  # Procesos para la carga masiva (0 = en serie); requiere POOL_QUEUE
+    INGEST_MAX_ZIP_ENTRY_BYTES: int = 512 * 1024 * 1024  # Tamaño descomprimido máximo de un archivo dentro de un zip
+    INGEST_MAX_ZIP_BYTES: int = 2 * 1024 * 1024 * 1024  # Tamaño descomprimido máximo de todo un zip
     
     class Config:
         env_file = ".env"
@@ -33,5 +79,9 @@ class Settings(BaseSettings):
         super().__init__(**kwargs)
         if not self.DATABASE_URL:
             self.DATABASE_URL = f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
+        if not self.ASYNC_DATABASE_URL:
+            # El mismo servidor con el driver asyncpg, cualquiera sea el driver de DATABASE_URL
+            url = make_url(self.DATABASE_URL).set(drivername="postgresql+asyncpg")
+            self.ASYNC_DATABASE_URL = url.render_as_string(hide_password=False)
 
 settings = Settings() 
\ No newline at end of file
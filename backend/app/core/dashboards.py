@@ -0,0 +1,113 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.core import widgets
+from app.models.dashboard import DashboardConfig, WidgetSeries
+from app.models.statistic import Statistic
+
+def load_widget_statistics(db: Session, statistic_ids: Iterable[int]) -> Dict[int, Tuple[int, List[str]]]:
+    """
+    Versión y columnas de las estadísticas referenciadas, en una sola consulta
+    """
+    statistic_ids = set(statistic_ids) - {None}
+    if not statistic_ids:
+        return {}
+    rows = db.query(Statistic.id, Statistic.version, Statistic.data).filter(
+        Statistic.id.in_(statistic_ids)
+    ).all()
+    return {row.id: (row.version, (row.data or {}).get("columns", [])) for row in rows}
+
+def is_fresh(
+    row: WidgetSeries, widget: Dict[str, Any], statistics: Dict[int, Tuple[int, List[str]]]
+) -> bool:
+    statistic_id = widgets.widget_statistic_id(widget)
+    current_version = statistics[statistic_id][0] if statistic_id in statistics else None
+    return (
+        row.widget_hash == widgets.widget_hash(widget)
+        and row.statistic_id == statistic_id
+        and row.statistic_version == current_version
+    )
+
+def stored_result(row: WidgetSeries, widget: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row.widget_id,
+        "type": widget.get("type"),
+        "statistic_id": row.statistic_id,
+        "version": row.statistic_version,
+        "data": row.data,
+        "error": row.error,
+    }
+
+def read_config_series(db: Session, config: DashboardConfig) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Datos de los widgets de un dashboard desde las series precalculadas. Los
+    widgets sin serie vigente se calculan en el momento. Retorna los
+    resultados y cuántos widgets no tenían serie vigente.
+    """
+    config_widgets = widgets.iter_widgets(config.widgets)
+    statistics = load_widget_statistics(
+        db, (widgets.widget_statistic_id(widget) for widget in config_widgets)
+    )
+    stored = {
+        row.widget_id: row
+        for row in db.query(WidgetSeries).filter(WidgetSeries.config_id == config.id)
+    }
+
+    results: Dict[str, Dict[str, Any]] = {}
+    stale = []
+    for widget in config_widgets:
+        row = stored.get(str(widget.get("id")))
+        if row is not None and is_fresh(row, widget, statistics):
+            results[row.widget_id] = stored_result(row, widget)
+        else:
+            stale.append(widget)
+
+    for result in widgets.resolve_widgets(stale, statistics):
+        results[result["id"]] = result
+    return [results[str(widget.get("id"))] for widget in config_widgets], len(stale)
+
+def refresh_config_series(db: Session, config: DashboardConfig) -> int:
+    """
+    Recalcular solo las series de los widgets cuya configuración o estadística
+    cambió, y eliminar las de widgets que ya no existen. Retorna cuántas se recalcularon.
+    """
+    # El lock de la configuración serializa los recálculos concurrentes del
+    # mismo dashboard, que si no insertarían dos veces la serie de un widget
+    config = db.query(DashboardConfig).filter(
+        DashboardConfig.id == config.id
+    ).populate_existing().with_for_update().first()
+    if config is None:
+        db.commit()
+        return 0
+
+    config_widgets = widgets.iter_widgets(config.widgets)
+    current = {str(widget.get("id")): widget for widget in config_widgets}
+    statistics = load_widget_statistics(
+        db, (widgets.widget_statistic_id(widget) for widget in config_widgets)
+    )
+    stored = {
+        row.widget_id: row
+        for row in db.query(WidgetSeries).filter(WidgetSeries.config_id == config.id)
+    }
+
+    stale = [
+        widget for widget_id, widget in current.items()
+        if widget_id not in stored or not is_fresh(stored[widget_id], widget, statistics)
+    ]
+    for result in widgets.resolve_widgets(stale, statistics):
+        row = stored.get(result["id"]) or WidgetSeries(config_id=config.id, widget_id=result["id"])
+        row.widget_hash = widgets.widget_hash(current[result["id"]])
+        row.statistic_id = result["statistic_id"]
+        row.statistic_version = result["version"]
+        row.data = jsonable_encoder(result["data"])
+        row.error = result["error"]
+        db.add(row)
+
+    for widget_id, row in stored.items():
+        if widget_id not in current:
+            db.delete(row)
+
+    db.commit()
+    return len(stale)
@@ -1,14 +1,18 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
+import json
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core import cache
 from app.core.config import settings
 from app.core.security import verify_token
-from app.db.session import SessionLocal
-from app.models.user import User
+from app.db.session import AsyncSessionLocal, SessionLocal
+from app.models.user import User, UserRole
 from app.schemas.auth import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
@@ -20,8 +24,42 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-async def get_current_user(
-    db: Session = Depends(get_db),
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def load_principal(email: str) -> Optional[User]:
+    """
+    Obtener el usuario autenticado desde la caché de principales; solo se
+    abre una sesión de base de datos si no está en caché
+    """
+    key = cache.principal_key(email)
+    cached = cache.get_cache().get(key)
+    if cached is not None:
+        fields = json.loads(cached)
+        fields["role"] = UserRole(fields["role"]) if fields["role"] else None
+        # Instancia transitoria: no está asociada a ninguna sesión
+        return User(**fields)
+    
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            return None
+        fields = {
+            "id": user.id,
+            "email": user.email,
+            "full_name": user.full_name,
+            "role": user.role.value if user.role else None,
+            "is_active": user.is_active,
+        }
+        cache.get_cache().set(key, json.dumps(fields).encode(), settings.PRINCIPAL_CACHE_TTL_SECONDS)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+def get_current_user(
     token: str = Depends(oauth2_scheme)
 ) -> User:
     credentials_exception = HTTPException(
@@ -39,7 +77,7 @@ async def get_current_user(
     except (jwt.JWTError, ValidationError):
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = load_principal(token_data.email)
     if user is None:
         raise credentials_exception
     return user
@@ -0,0 +1,211 @@
+from typing import Any, Dict, List, Optional, Set
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Columnas de texto con pocos valores distintos se guardan con codificación de diccionario
+CATEGORY_MAX_UNIQUE = 1000
+CATEGORY_MAX_RATIO = 0.5
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d",
+    "%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+)
+INTEGER_TYPES = (pa.int8(), pa.int16(), pa.int32(), pa.int64())
+CATEGORY_TYPE = pa.dictionary(pa.int32(), pa.string())
+UNITS_PER_DAY = {"s": 86_400, "ms": 86_400_000, "us": 86_400_000_000, "ns": 86_400_000_000_000}
+
+def is_midnight(values: pa.Array) -> bool:
+    """
+    Si todas las marcas de tiempo caen a medianoche (es decir, son fechas)
+    """
+    if len(values) == 0:
+        return True
+    days = values.cast(pa.date32()).cast(pa.int32()).cast(pa.int64())
+    raw = values.cast(pa.int64())
+    return pc.all(pc.equal(pc.multiply(days, UNITS_PER_DAY[values.type.unit]), raw)).as_py()
+
+def integer_type(minimum: Any, maximum: Any) -> Optional[pa.DataType]:
+    """
+    Tipo entero más pequeño que contiene el rango
+    """
+    for candidate in INTEGER_TYPES:
+        bits = candidate.bit_width - 1
+        if -(2 ** bits) <= minimum and maximum < 2 ** bits:
+            return candidate
+    return None
+
+class ColumnProfile:
+    """
+    Lo observado en una columna al recorrer el archivo por lotes: si los
+    números son enteros y su rango, los valores distintos de los textos y los
+    formatos de fecha con los que se pueden interpretar
+    """
+    def __init__(self, field: pa.Field):
+        self.field = field
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        numeric = pa.types.is_floating(field.type) or pa.types.is_integer(field.type)
+        text = pa.types.is_string(field.type)
+        self.integral = numeric
+        self.float32 = pa.types.is_floating(field.type)
+        self.uniques: Optional[Set[str]] = set() if text else None
+        # Formatos de fecha que calzan con todos los valores y si todos caen a medianoche
+        self.date_formats: Dict[str, bool] = dict.fromkeys(DATE_FORMATS, True) if text else {}
+        self.midnight = pa.types.is_timestamp(field.type)
+
+    def update(self, array: pa.Array) -> None:
+        values = array.filter(pc.is_valid(array))
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        field_type = self.field.type
+
+        if pa.types.is_floating(field_type) or pa.types.is_integer(field_type):
+            bounds = pc.min_max(values)
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+            if self.integral and pa.types.is_floating(field_type):
+                try:
+                    values.cast(pa.int64())
+                except pa.ArrowInvalid:
+                    self.integral = False
+            if self.float32:
+                roundtrip = values.cast(pa.float32()).cast(pa.float64())
+                self.float32 = pc.all(pc.equal(roundtrip, values.cast(pa.float64()))).as_py()
+
+        elif pa.types.is_string(field_type):
+            if self.uniques is not None:
+                self.uniques.update(pc.unique(values).to_pylist())
+                if len(self.uniques) > CATEGORY_MAX_UNIQUE:
+                    self.uniques = None
+            for date_format, midnight in list(self.date_formats.items()):
+                try:
+                    parsed = pc.strptime(values, format=date_format, unit="s")
+                except pa.ArrowInvalid:
+                    del self.date_formats[date_format]
+                    continue
+                self.date_formats[date_format] = midnight and is_midnight(parsed)
+
+        elif pa.types.is_timestamp(field_type):
+            if self.midnight:
+                self.midnight = is_midnight(values)
+
+    def target_type(self) -> pa.DataType:
+        """
+        Tipo compacto para la columna según lo observado
+        """
+        field_type = self.field.type
+        if self.count == 0:
+            return field_type
+        if self.integral:
+            return integer_type(self.minimum, self.maximum) or field_type
+        if self.float32:
+            return pa.float32()
+        if self.date_formats:
+            return pa.date32() if next(iter(self.date_formats.values())) else pa.timestamp("s")
+        if self.uniques is not None and len(self.uniques) <= max(1, CATEGORY_MAX_RATIO * self.count):
+            return CATEGORY_TYPE
+        if pa.types.is_timestamp(field_type) and self.midnight:
+            return pa.date32()
+        return field_type
+
+class SchemaProfile:
+    """
+    Inferencia del esquema compacto de un archivo a partir de todos sus lotes
+    """
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+        self.columns = [ColumnProfile(field) for field in schema]
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        for profile, column in zip(self.columns, batch.columns):
+            profile.update(column)
+
+    def target_schema(self) -> pa.Schema:
+        return pa.schema([
+            profile.field.with_type(profile.target_type()) for profile in self.columns
+        ])
+
+    def convert(self, batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+        """
+        Convertir un lote al esquema compacto
+        """
+        arrays = []
+        for profile, column, field in zip(self.columns, batch.columns, schema):
+            source_type = profile.field.type
+            if field.type == source_type:
+                arrays.append(column)
+            elif pa.types.is_string(source_type) and field.type == CATEGORY_TYPE:
+                arrays.append(column.dictionary_encode())
+            elif pa.types.is_string(source_type):
+                parsed = pc.strptime(column, format=next(iter(profile.date_formats)), unit="s")
+                arrays.append(parsed.cast(field.type))
+            else:
+                arrays.append(column.cast(field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def logical_type(data_type: pa.DataType) -> str:
+    if pa.types.is_integer(data_type):
+        return "integer"
+    if pa.types.is_floating(data_type):
+        return "float"
+    if pa.types.is_boolean(data_type):
+        return "boolean"
+    if pa.types.is_date(data_type):
+        return "date"
+    if pa.types.is_timestamp(data_type):
+        return "datetime"
+    if pa.types.is_dictionary(data_type):
+        return "category"
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return "text"
+    return str(data_type)
+
+def describe_schema(schema: pa.Schema) -> List[Dict[str, str]]:
+    """
+    Esquema en forma apta para JSON, para Statistic.metadata
+    """
+    return [
+        {"name": field.name, "type": logical_type(field.type), "storage": str(field.type)}
+        for field in schema
+    ]
+
+def text_values(column: pd.Series) -> pd.Series:
+    return column.map(lambda value: None if pd.isna(value) else str(value))
+
+def conform_column(column: pd.Series, data_type: pa.DataType) -> pa.Array:
+    if pa.types.is_dictionary(data_type):
+        values = pa.array(text_values(column), type=data_type.value_type).dictionary_encode()
+        return values.cast(data_type)
+    if pa.types.is_date(data_type) or pa.types.is_timestamp(data_type):
+        values = pa.array(pd.to_datetime(column), from_pandas=True)
+        if pa.types.is_date(data_type) and not is_midnight(values.filter(pc.is_valid(values))):
+            raise ValueError("Valores con hora en una columna de fechas")
+        return values.cast(data_type)
+    if pa.types.is_string(data_type):
+        return pa.array(text_values(column), type=pa.string())
+    values = pa.array(column, from_pandas=True)
+    if pa.types.is_float32(data_type):
+        # Igual que al inferir el esquema: float32 solo si los valores no pierden precisión
+        wide = values.cast(pa.float64())
+        if not pc.all(pc.equal(wide.cast(pa.float32()).cast(pa.float64()), wide)).as_py():
+            raise ValueError("Valores que no caben en float32 sin perder precisión")
+    return values.cast(data_type)
+
+def conform_frame(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """
+    Convertir filas nuevas a los tipos ya guardados; las columnas que no vienen
+    quedan vacías. Lanza ValueError si algún valor no cabe en el tipo de su
+    columna (por ejemplo un entero fuera de rango o texto en una columna numérica).
+    """
+    arrays = []
+    for field in schema:
+        column = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        try:
+            arrays.append(conform_column(column.reset_index(drop=True), field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError, ValueError) as e:
+            raise ValueError(f"La columna {field.name} no admite los valores enviados: {e}") from e
+    return pa.Table.from_arrays(arrays, schema=schema)
@@ -0,0 +1,122 @@
+from typing import Iterator, List
+import enum
+import io
+import tempfile
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from app.core import storage
+
+CHUNK_SIZE = 1024 * 1024
+
+class ExportFormat(str, enum.Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+    XLSX = "xlsx"
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+    ExportFormat.XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def sheet_title(title: str, used: set) -> str:
+    """
+    Nombre de hoja válido para Excel: sin caracteres prohibidos, máximo 31 caracteres y único
+    """
+    base = "".join("_" if char in '[]:*?/\\' else char for char in title)[:31] or "Hoja"
+    name = base
+    counter = 1
+    while name.lower() in used:
+        suffix = f" ({counter})"
+        name = base[:31 - len(suffix)] + suffix
+        counter += 1
+    used.add(name.lower())
+    return name
+
+def iter_csv(statistic_id: int, version: int) -> Iterator[bytes]:
+    """
+    CSV generado lote a lote desde el almacenamiento columnar
+    """
+    first = True
+    for batch in storage.iter_statistic_batches(statistic_id, version):
+        # El escritor CSV necesita los valores de las columnas con diccionario
+        columns = [
+            column.dictionary_decode() if pa.types.is_dictionary(column.type) else column
+            for column in batch.columns
+        ]
+        buffer = io.BytesIO()
+        pa_csv.write_csv(
+            pa.Table.from_arrays(columns, names=batch.schema.names),
+            buffer,
+            write_options=pa_csv.WriteOptions(include_header=first),
+        )
+        first = False
+        yield buffer.getvalue()
+
+    if first:
+        # Sin filas: solo el encabezado con las columnas guardadas
+        parquet_file, _ = next(storage.iter_segment_files(statistic_id, version))
+        names = parquet_file.schema_arrow.names
+        buffer = io.BytesIO()
+        pa_csv.write_csv(pa.table({name: pa.array([], pa.string()) for name in names}), buffer)
+        yield buffer.getvalue()
+
+def iter_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_parquet(statistic_id: int, version: int) -> Iterator[bytes]:
+    """
+    Los datos ya están guardados en Parquet: si la versión está en un solo
+    archivo se envía tal cual; si está formada por segmentos se unen lote a
+    lote en un archivo temporal
+    """
+    path = storage.statistic_file(statistic_id, version)
+    if path is not None:
+        yield from iter_file(path)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".parquet") as tmp:
+        writer = None
+        for batch in storage.iter_statistic_batches(statistic_id, version):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp.name, batch.schema, compression="zstd")
+            writer.write_table(pa.Table.from_batches([batch]))
+        if writer is None:
+            pq.write_table(storage.read_statistic_table(statistic_id, version), tmp.name)
+        else:
+            writer.close()
+        yield from iter_file(tmp.name)
+
+def iter_xlsx(statistic_id: int, version: int, columns: List[str], title: str) -> Iterator[bytes]:
+    """
+    El formato xlsx es un zip que solo se puede cerrar al final, así que el
+    libro se escribe en modo write-only a un archivo temporal en disco (no en
+    memoria) y luego se envía por bloques
+    """
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=title)
+        sheet.append(columns)
+        for batch in storage.iter_statistic_batches(statistic_id, version):
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                sheet.append(row)
+        workbook.save(tmp.name)
+        yield from iter_file(tmp.name)
+
+def iter_export(
+    export_format: ExportFormat, statistic_id: int, version: int, columns: List[str], title: str
+) -> Iterator[bytes]:
+    if export_format == ExportFormat.CSV:
+        return iter_csv(statistic_id, version)
+    if export_format == ExportFormat.PARQUET:
+        return iter_parquet(statistic_id, version)
+    return iter_xlsx(statistic_id, version, columns, title)
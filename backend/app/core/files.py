@@ -0,0 +1,168 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+import os
+import re
+
+import anyio
+from fastapi import Request, Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.etag import etag_matches, http_date, is_not_modified
+
+CHUNK_SIZE = 1024 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeFileResponse(Response):
+    """
+    Respuesta con un archivo completo o un rango de bytes. Si el servidor ASGI
+    soporta la extensión "http.response.zerocopysend" el archivo se envía con
+    sendfile sin pasar por Python; si no, se lee por bloques en un hilo.
+    uvicorn no implementa esa extensión: para no pasar los archivos por Python
+    hay que delegarlos al proxy con FILES_ACCEL_REDIRECT_LOCATION.
+    """
+    def __init__(
+        self,
+        path: Path,
+        start: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as file:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            await anyio.to_thread.run_sync(file.seek, self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpretar un único rango "bytes=inicio-fin". Retorna (inicio, largo),
+    None si el encabezado no se puede usar (se envía el archivo completo) o
+    lanza ValueError si el rango no es satisfacible.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Rangos múltiples o de otra unidad: se ignoran
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError("Rango vacío")
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Rango fuera del archivo")
+    return start, end - start + 1
+
+def accel_redirect_uri(path: Path) -> Optional[str]:
+    """
+    URI interna del proxy para un archivo bajo UPLOAD_DIR, o None si no se
+    delega el envío
+    """
+    location = settings.FILES_ACCEL_REDIRECT_LOCATION
+    if not location:
+        return None
+    try:
+        relative = path.resolve().relative_to(Path(settings.UPLOAD_DIR).resolve())
+    except ValueError:
+        return None
+    return f"{location.rstrip('/')}/{quote(relative.as_posix())}"
+
+def file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: Optional[str] = None,
+) -> Response:
+    """
+    Servir un archivo con ETag, Last-Modified, respuestas 304 y soporte de Range.
+    Con FILES_ACCEL_REDIRECT_LOCATION el archivo lo envía el proxy (nginx),
+    que resuelve también los rangos y las respuestas 304.
+    """
+    redirect = accel_redirect_uri(path)
+    if redirect is not None:
+        headers = {"X-Accel-Redirect": redirect, "Cache-Control": "private, no-cache"}
+        if filename:
+            headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return Response(headers=headers, media_type=media_type)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+    etag = f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{size:x}"'
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range:
+        # Solo se respeta el rango si el cliente tiene la misma versión del archivo
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            use_range = etag_matches(if_range, etag) and not if_range.startswith("W/")
+        else:
+            use_range = if_range.strip() == headers["Last-Modified"]
+        if not use_range:
+            range_header = None
+
+    if range_header:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, length = byte_range
+            headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+            return RangeFileResponse(path, start, length, 206, headers, media_type)
+
+    return RangeFileResponse(path, 0, size, 200, headers, media_type)
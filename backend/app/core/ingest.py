@@ -0,0 +1,279 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import codecs
+import csv
+import io
+import logging
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from app.core import pools, storage
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".xls", ".xlsx", ".csv", ".parquet")
+CSV_SAMPLE_SIZE = 64 * 1024
+CSV_DELIMITERS = ",;\t|"
+CSV_ERROR_COLUMN = re.compile(r"CSV column #(\d+)")
+CSV_INTEGER_ERROR = re.compile(r"conversion error to u?int\d+")
+
+# Bloque leído de un archivo: DataFrame (Excel) o tabla Arrow (CSV y Parquet)
+Chunk = Union[pd.DataFrame, pa.Table]
+
+# Resultado de cargar un archivo: (resumen, error)
+Outcome = Tuple[Optional[Dict[str, Any]], Optional[str]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if _executor is None:
+        _executor = pools.create_process_pool(settings.INGEST_WORKERS, "Carga masiva")
+    return _executor
+
+def is_supported(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+class CountingReader:
+    """
+    Envoltorio de un archivo que cuenta los bytes leídos, para informar el avance
+    """
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        position = self.file.seek(offset, whence)
+        self.bytes_read = position
+        return position
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file, name)
+
+def build_header(row: List[Any]) -> List[str]:
+    """
+    Nombres de columna a partir de la primera fila, con el mismo criterio que pd.read_excel
+    """
+    header: List[str] = []
+    seen = {}
+    for position, value in enumerate(row):
+        name = f"Unnamed: {position}" if value is None or str(value).strip() == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+def iter_excel_chunks(
+    file: BinaryIO, filename: str, chunk_size: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Leer la primera hoja de un archivo Excel en bloques de filas.
+    Los .xlsx se recorren en modo de solo lectura de openpyxl, por lo que la
+    memoria usada depende del tamaño del bloque y no del tamaño de la planilla.
+    """
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+
+    if filename.endswith(".xls"):
+        # openpyxl no lee el formato antiguo; se carga completo y se entrega por bloques
+        df = pd.read_excel(file)
+        if df.empty:
+            yield df
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+        return
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = None
+        emitted = False
+        buffer: List[tuple] = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if header is None:
+                header = build_header(list(row))
+                continue
+            # Ajustar cada fila al ancho del encabezado
+            row = tuple(row[:len(header)]) + (None,) * (len(header) - len(row))
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame.from_records(buffer, columns=header)
+                emitted = True
+                buffer = []
+        if header is not None and (buffer or not emitted):
+            # Se entrega al menos un bloque (aunque esté vacío) para conservar las columnas
+            yield pd.DataFrame.from_records(buffer, columns=header)
+    finally:
+        workbook.close()
+
+def sniff_csv(file: BinaryIO) -> Tuple[str, str, List[str]]:
+    """
+    Codificación, separador y encabezado de un CSV a partir del inicio del
+    archivo. Se acepta UTF-8 (con o sin BOM) y, si no lo es, Latin-1.
+    """
+    sample = file.read(CSV_SAMPLE_SIZE)
+    file.seek(0)
+    try:
+        text = codecs.getincrementaldecoder("utf-8-sig")().decode(sample)
+        encoding = "utf8"
+    except UnicodeDecodeError:
+        text = sample.decode("latin-1")
+        encoding = "latin-1"
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    first_row = next(csv.reader(io.StringIO(text), delimiter=delimiter), [])
+    return encoding, delimiter, build_header(first_row)
+
+def iter_csv_chunks(file: BinaryIO, column_types: Optional[Dict[int, pa.DataType]] = None) -> Iterator[Chunk]:
+    """
+    Leer un CSV en bloques con el lector de Arrow, que separa y convierte las
+    columnas en varios hilos sin pasar por objetos de Python. Los tipos se
+    infieren del primer bloque, salvo los de las columnas en column_types.
+    """
+    encoding, delimiter, header = sniff_csv(file)
+    if not header:
+        yield pd.DataFrame()
+        return
+
+    column_types = {
+        header[index]: data_type for index, data_type in (column_types or {}).items() if index < len(header)
+    }
+    reader = pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(
+            column_names=header,
+            skip_rows=1,
+            block_size=settings.INGEST_CSV_BLOCK_SIZE,
+            encoding=encoding,
+            use_threads=True,
+        ),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+    )
+    emitted = False
+    for batch in reader:
+        yield pa.Table.from_batches([batch])
+        emitted = True
+    if not emitted:
+        yield reader.schema.empty_table()
+
+def iter_parquet_chunks(file: BinaryIO, chunk_size: Optional[int] = None) -> Iterator[Chunk]:
+    """
+    Leer un archivo Parquet por lotes, sin el índice que agrega pandas al escribirlo
+    """
+    parquet_file = pq.ParquetFile(file)
+    columns = [
+        name for name in parquet_file.schema_arrow.names
+        if not name.startswith("__index_level_")
+    ]
+    emitted = False
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_size or settings.INGEST_CHUNK_SIZE, columns=columns
+    ):
+        yield pa.Table.from_batches([batch])
+        emitted = True
+    if not emitted:
+        yield parquet_file.schema_arrow.empty_table().select(columns)
+
+def iter_file_chunks(
+    file: BinaryIO, filename: str, column_types: Optional[Dict[int, pa.DataType]] = None
+) -> Iterator[Chunk]:
+    """
+    Leer un archivo en bloques según su extensión
+    """
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return iter_csv_chunks(file, column_types)
+    if name.endswith(".parquet"):
+        return iter_parquet_chunks(file)
+    return iter_excel_chunks(file, name)
+
+def write_file_chunks(
+    file: BinaryIO,
+    filename: str,
+    statistic_id: int,
+    version: int,
+    progress: Optional[Callable[[Iterator[Chunk]], Iterator[Chunk]]] = None,
+) -> Dict[str, Any]:
+    """
+    Escribir un archivo en el almacenamiento de la estadística. Si una columna
+    de un CSV trae en un bloque posterior valores que no caben en el tipo que
+    le dieron los primeros, el archivo se vuelve a leer con esa columna como
+    float64 si era entera (por ejemplo decimales después de enteros) y si no
+    como texto.
+    """
+    column_types: Dict[int, pa.DataType] = {}
+    while True:
+        chunks = iter_file_chunks(file, filename, column_types)
+        if progress is not None:
+            chunks = progress(chunks)
+        try:
+            return storage.write_statistic_chunks(statistic_id, version, chunks)
+        except pa.ArrowInvalid as e:
+            match = CSV_ERROR_COLUMN.search(str(e))
+            if not match:
+                raise
+            column = int(match.group(1))
+            if column not in column_types and CSV_INTEGER_ERROR.search(str(e)):
+                column_types[column] = pa.float64()
+            elif column_types.get(column) != pa.string():
+                column_types[column] = pa.string()
+            else:
+                raise
+            file.seek(0)
+
+def ingest_file(file_path: str, filename: str, statistic_id: int, version: int = 1) -> Dict[str, Any]:
+    """
+    Leer un archivo y escribirlo en el almacenamiento de la estadística.
+    Se ejecuta en los procesos del pool de carga masiva, sin tocar la base de datos.
+    """
+    with open(file_path, "rb") as file:
+        return write_file_chunks(file, filename, statistic_id, version)
+
+def collect(future: Future) -> Outcome:
+    try:
+        return future.result(), None
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return None, str(e)
+
+def ingest_files(files: List[Tuple[str, str, int]]) -> List[Outcome]:
+    """
+    Cargar varios archivos (ruta, nombre, id de estadística) en paralelo en el
+    pool de procesos; si no hay pool disponible se cargan en serie. El error de
+    un archivo se informa en su resultado sin afectar a los demás.
+    """
+    executor = get_executor() if len(files) > 1 else None
+    if executor is not None:
+        try:
+            futures = [executor.submit(ingest_file, *file) for file in files]
+            return [collect(future) for future in futures]
+        except (BrokenProcessPool, AssertionError, OSError) as e:
+            logger.warning("Pool de procesos no disponible, cargando en serie: %s", e)
+
+    outcomes: List[Outcome] = []
+    for file in files:
+        try:
+            outcomes.append((ingest_file(*file), None))
+        except Exception as e:
+            outcomes.append((None, str(e)))
+    return outcomes
@@ -0,0 +1,42 @@
+from typing import Any, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Query
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Token opaco para pedir la página siguiente
+    """
+    raw = json.dumps({"id": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Cursor de paginación inválido"
+        )
+
+def paginate(
+    query: Query, id_column: Any, cursor: Optional[str], limit: int
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Paginación por cursor (keyset) sobre la clave primaria: cada página filtra
+    por id > último id visto, así las páginas profundas cuestan lo mismo que
+    la primera y no se corren si se insertan filas entre consultas
+    """
+    if cursor:
+        query = query.filter(id_column > decode_cursor(cursor))
+    items = query.order_by(id_column).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].id)
+    return items, next_cursor
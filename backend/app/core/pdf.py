@@ -1,34 +1,131 @@
 from weasyprint import HTML
-from jinja2 import Environment, FileSystemLoader
-import json
+from jinja2 import Environment, FileSystemLoader, Template
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import logging
 import pandas as pd
 
-def create_html_report(title: str, description: str, statistics: List[Dict[str, Any]]) -> str:
+from app.core import pools, storage
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+TABLE_POLICIES = {"truncate", "paginate", "summarize"}
+TABLE_CLASSES = ["table", "table-striped"]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+@lru_cache(maxsize=None)
+def get_template(name: str) -> Template:
+    """
+    Plantillas compiladas una sola vez por proceso
+    """
+    env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), auto_reload=False)
+    return env.get_template(name)
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if _executor is None:
+        _executor = pools.create_process_pool(settings.PDF_WORKERS, "Renderizado de PDF")
+    return _executor
+
+def table_html(df: pd.DataFrame) -> str:
+    return df.to_html(classes=TABLE_CLASSES, index=False, na_rep="")
+
+def render_statistic_fragment(stat: Dict[str, Any], policy: str, max_rows: int) -> Dict[str, Any]:
+    """
+    HTML de una estadística según la política para tablas grandes:
+    - truncate: solo las primeras max_rows filas
+    - paginate: las primeras max_rows filas y el resto en anexos
+    - summarize: resumen estadístico de las columnas en lugar de las filas
+    Si la estadística trae "statistic_id" y "version" los datos se leen del
+    almacenamiento en el proceso que renderiza; si trae "data" se usan esos datos.
+    """
+    if "data" in stat:
+        df = pd.DataFrame(stat["data"])
+        total_rows = len(df)
+    else:
+        total_rows = (stat.get("metadata") or {}).get("rows")
+        if policy == "truncate":
+            df = storage.read_statistic_rows(stat["statistic_id"], stat["version"], 0, max_rows)
+        else:
+            df = storage.read_statistic_data(stat["statistic_id"], stat["version"])
+        if total_rows is None or policy != "truncate":
+            total_rows = len(df)
+
+    fragment = {
+        "title": stat["title"],
+        "description": stat["description"],
+        "metadata": stat["metadata"],
+        "note": None,
+        "appendices": [],
+    }
+
+    if total_rows <= max_rows:
+        fragment["table"] = table_html(df)
+    elif policy == "summarize":
+        summary = df.describe(include="all").transpose().reset_index().rename(columns={"index": "columna"})
+        fragment["table"] = table_html(summary)
+        fragment["note"] = f"Resumen de {total_rows} filas"
+    elif policy == "paginate":
+        fragment["table"] = table_html(df.head(max_rows))
+        fragment["note"] = f"Se muestran {max_rows} de {total_rows} filas; el resto está en los anexos"
+        for part, start in enumerate(range(max_rows, total_rows, max_rows), start=1):
+            fragment["appendices"].append({
+                "title": f"{stat['title']} (anexo {part})",
+                "table": table_html(df.iloc[start:start + max_rows]),
+            })
+    else:
+        fragment["table"] = table_html(df.head(max_rows))
+        fragment["note"] = f"Se muestran {max_rows} de {total_rows} filas"
+    return fragment
+
+def render_fragments(statistics: List[Dict[str, Any]], policy: str, max_rows: int) -> List[Dict[str, Any]]:
+    """
+    Renderizar los fragmentos en paralelo en un pool de procesos; si no hay
+    pool disponible (PDF_WORKERS=0 o un proceso que no puede crear hijos) se
+    renderizan en serie
+    """
+    executor = get_executor() if len(statistics) > 1 else None
+    if executor is not None:
+        try:
+            futures = [
+                executor.submit(render_statistic_fragment, stat, policy, max_rows)
+                for stat in statistics
+            ]
+            return [future.result() for future in futures]
+        except (BrokenProcessPool, AssertionError, OSError) as e:
+            logger.warning("Pool de procesos no disponible, renderizando en serie: %s", e)
+    return [render_statistic_fragment(stat, policy, max_rows) for stat in statistics]
+
+def create_html_report(
+    title: str,
+    description: str,
+    statistics: List[Dict[str, Any]],
+    table_policy: Optional[str] = None,
+    max_rows: Optional[int] = None,
+) -> str:
     """
     Crear el HTML para el reporte usando Jinja2
     """
-    env = Environment(loader=FileSystemLoader("app/templates"))
-    template = env.get_template("report_template.html")
-    
+    table_policy = table_policy or settings.PDF_TABLE_POLICY
+    if table_policy not in TABLE_POLICIES:
+        raise ValueError(f"Política de tablas inválida: {table_policy}")
+    max_rows = max_rows or settings.PDF_TABLE_MAX_ROWS
+
     # Procesar los datos para la visualización
-    processed_stats = []
-    for stat in statistics:
-        df = pd.DataFrame(stat["data"])
-        table_html = df.to_html(classes=["table", "table-striped"], index=False)
-        
-        processed_stats.append({
-            "title": stat["title"],
-            "description": stat["description"],
-            "table": table_html,
-            "metadata": stat["metadata"]
-        })
-    
-    return template.render(
+    processed_stats = render_fragments(statistics, table_policy, max_rows)
+    appendices = [appendix for stat in processed_stats for appendix in stat["appendices"]]
+
+    return get_template("report_template.html").render(
         title=title,
         description=description,
         statistics=processed_stats,
+        appendices=appendices,
         creation_date=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
     )
 
@@ -36,4 +133,4 @@ def generate_pdf(html_content: str, output_path: str) -> None:
     """
     Generar PDF a partir del HTML usando WeasyPrint
     """
-    HTML(string=html_content).write_pdf(output_path) 
\ No newline at end of file
+    HTML(string=html_content).write_pdf(output_path)
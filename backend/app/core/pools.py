@@ -0,0 +1,26 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+def create_process_pool(workers: int, purpose: str) -> Optional[ProcessPoolExecutor]:
+    """
+    Pool de hasta `workers` procesos, sin superar los CPU disponibles, o None
+    para trabajar en serie. Los hijos de un worker prefork de Celery son
+    procesos daemon y no pueden crear procesos propios: en ellos no se crea
+    el pool. Las tareas que lo usan van a la cola POOL_QUEUE, que se atiende
+    con un worker de concurrencia 1 (--pool=solo), así cada tarea usa todos
+    los CPU sin multiplicar los procesos por la concurrencia del worker.
+    """
+    if workers <= 0:
+        return None
+    if multiprocessing.current_process().daemon:
+        logger.warning(
+            "%s en serie: el proceso es daemon y no puede crear un pool; "
+            "definir POOL_QUEUE y atenderla con un worker --pool=solo", purpose
+        )
+        return None
+    return ProcessPoolExecutor(max_workers=min(workers, os.cpu_count() or 1))
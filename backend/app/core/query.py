@@ -0,0 +1,177 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+AGGREGATIONS = {"sum", "mean", "count", "min", "max"}
+NUMERIC_AGGREGATIONS = {"sum", "mean"}
+FILTER_OPERATORS = {"eq", "ne", "gt", "gte", "lt", "lte", "in", "contains"}
+
+def parse_aggregations(specs: List[str]) -> List[Tuple[str, str]]:
+    """
+    Interpretar agregaciones con formato "columna:función", por ejemplo "poblacion:sum".
+    "*:count" cuenta filas.
+    """
+    aggregations = []
+    for spec in specs:
+        column, _, func = spec.rpartition(":")
+        if not column or func not in AGGREGATIONS:
+            raise ValueError(f"Agregación inválida: {spec}")
+        if column == "*" and func != "count":
+            raise ValueError(f"Solo se puede usar count con '*': {spec}")
+        aggregations.append((column, func))
+    return aggregations
+
+def parse_filters(specs: List[str]) -> List[Tuple[str, str, str]]:
+    """
+    Interpretar filtros con formato "columna:operador:valor", por ejemplo "anio:gte:2020".
+    El operador "in" recibe valores separados por coma.
+    """
+    filters = []
+    for spec in specs:
+        parts = spec.split(":", 2)
+        if len(parts) != 3 or parts[1] not in FILTER_OPERATORS:
+            raise ValueError(f"Filtro inválido: {spec}")
+        filters.append((parts[0], parts[1], parts[2]))
+    return filters
+
+def parse_sort(specs: List[str]) -> List[Tuple[str, bool]]:
+    """
+    Interpretar ordenamientos: "columna" ascendente, "-columna" descendente
+    """
+    return [(spec[1:], False) if spec.startswith("-") else (spec, True) for spec in specs]
+
+def check_aggregated(group_by: List[str], aggregations: List[Tuple[str, str]]) -> None:
+    """
+    Las consultas retornan solo resultados agregados: sin agrupar ni agregar
+    se devolverían las filas completas
+    """
+    if not group_by and not aggregations:
+        raise ValueError("La consulta debe indicar group_by o agg")
+
+def referenced_columns(
+    group_by: List[str],
+    aggregations: List[Tuple[str, str]],
+    filters: List[Tuple[str, str, str]],
+) -> Set[str]:
+    """
+    Columnas que hay que leer del almacenamiento
+    """
+    check_aggregated(group_by, aggregations)
+    columns = set(group_by)
+    columns.update(column for column, _ in aggregations if column != "*")
+    columns.update(column for column, _, _ in filters)
+    return columns
+
+def coerce_value(series: pd.Series, value: str) -> Any:
+    if pd.api.types.is_bool_dtype(series):
+        return value.lower() in ("1", "true", "si", "sí")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
+
+def apply_filters(df: pd.DataFrame, filters: List[Tuple[str, str, str]]) -> pd.DataFrame:
+    mask = pd.Series(True, index=df.index)
+    for column, operator, raw_value in filters:
+        series = df[column]
+        if operator == "in":
+            values = [coerce_value(series, value) for value in raw_value.split(",")]
+            mask &= series.isin(values)
+        elif operator == "contains":
+            mask &= series.astype(str).str.contains(raw_value, case=False, regex=False, na=False)
+        else:
+            if operator not in ("eq", "ne") and isinstance(series.dtype, pd.CategoricalDtype):
+                # Las columnas categóricas no tienen orden: se comparan por sus valores
+                series = series.astype(series.cat.categories.dtype)
+            value = coerce_value(series, raw_value)
+            if operator == "eq":
+                mask &= series == value
+            elif operator == "ne":
+                mask &= series != value
+            elif operator == "gt":
+                mask &= series > value
+            elif operator == "gte":
+                mask &= series >= value
+            elif operator == "lt":
+                mask &= series < value
+            elif operator == "lte":
+                mask &= series <= value
+    return df[mask]
+
+def sort_key(series: pd.Series) -> pd.Series:
+    # Las categóricas se ordenan por su valor y no por el orden de su diccionario
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+def run_query(
+    df: pd.DataFrame,
+    group_by: List[str],
+    aggregations: List[Tuple[str, str]],
+    filters: List[Tuple[str, str, str]],
+    sort: List[Tuple[str, bool]],
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Filtrar, agrupar, agregar y ordenar los datos de una estadística con operaciones vectorizadas
+    """
+    check_aggregated(group_by, aggregations)
+    columns = set(group_by) | {column for column, _, _ in filters}
+    columns.update(column for column, _ in aggregations if column != "*")
+    missing = columns - set(df.columns)
+    if missing:
+        raise ValueError(f"Columnas inexistentes: {', '.join(sorted(missing))}")
+
+    non_numeric = sorted({
+        column for column, func in aggregations
+        if func in NUMERIC_AGGREGATIONS and not pd.api.types.is_numeric_dtype(df[column])
+    })
+    if non_numeric:
+        raise ValueError(f"Solo se pueden sumar o promediar columnas numéricas: {', '.join(non_numeric)}")
+
+    if filters:
+        df = apply_filters(df, filters)
+
+    # min y max de una categórica se calculan sobre sus valores, porque el diccionario no tiene orden
+    ordered = {
+        column: df[column].cat.categories.dtype
+        for column, func in aggregations
+        if func in ("min", "max") and isinstance(df[column].dtype, pd.CategoricalDtype)
+    }
+    if ordered:
+        df = df.astype(ordered)
+
+    if aggregations:
+        named: Dict[str, Tuple[str, str]] = {}
+        for column, func in aggregations:
+            name = "count" if column == "*" else f"{column}_{func}"
+            # "*:count" cuenta filas usando cualquier columna como referencia
+            named[name] = (column if column != "*" else None, "size" if column == "*" else func)
+        if group_by:
+            grouped = df.groupby(group_by, dropna=False, sort=False, observed=True)
+            result = grouped.agg(**{
+                name: (column or group_by[0], func) for name, (column, func) in named.items()
+            }).reset_index()
+        else:
+            result = pd.DataFrame([{
+                name: len(df) if func == "size" else df[column].agg(func)
+                for name, (column, func) in named.items()
+            }])
+    else:
+        result = df.groupby(group_by, dropna=False, sort=False, observed=True).size().reset_index(name="count")
+
+    if sort:
+        unknown = {column for column, _ in sort} - set(result.columns)
+        if unknown:
+            raise ValueError(f"Columnas de orden inexistentes: {', '.join(sorted(unknown))}")
+        result = result.sort_values(
+            [column for column, _ in sort],
+            ascending=[ascending for _, ascending in sort],
+            kind="stable",
+            key=sort_key,
+        )
+
+    if limit is not None:
+        result = result.head(limit)
+    return result.reset_index(drop=True)
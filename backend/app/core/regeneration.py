@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+import redis
+from redis.exceptions import LockError
+from redis.lock import Lock
+
+from app.core.config import settings
+
+# Misma instancia de Redis que usa Celery como broker
+_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
+
+def token_key(report_id: int) -> str:
+    return f"report:regeneration:{report_id}"
+
+def lock_key(report_id: int) -> str:
+    return f"report:lock:{report_id}"
+
+def dashboard_refresh_key(config_id: int) -> str:
+    return f"dashboard:refresh:{config_id}"
+
+def claim_dashboard_refresh(config_id: int, ttl: int) -> bool:
+    """
+    Registrar un recálculo pendiente de las series de un dashboard. Retorna
+    False si ya hay uno programado dentro de los últimos ttl segundos.
+    """
+    return bool(_client.set(dashboard_refresh_key(config_id), 1, nx=True, ex=ttl))
+
+def next_token(report_id: int) -> int:
+    """
+    Registrar una nueva solicitud de regeneración. Solo la tarea con el token
+    más reciente genera el archivo; las anteriores quedan obsoletas.
+    """
+    pipe = _client.pipeline()
+    pipe.incr(token_key(report_id))
+    pipe.expire(token_key(report_id), 24 * 60 * 60)
+    token, _ = pipe.execute()
+    return int(token)
+
+def is_latest(report_id: int, token: int) -> bool:
+    current = _client.get(token_key(report_id))
+    return current is None or int(current) == token
+
+def acquire_lock(report_id: int) -> Optional[Lock]:
+    """
+    Tomar el lock de generación de un reporte sin esperar; None si otra tarea lo tiene
+    """
+    lock = _client.lock(lock_key(report_id), timeout=settings.REPORT_LOCK_TIMEOUT)
+    return lock if lock.acquire(blocking=False) else None
+
+def release_lock(lock: Lock) -> None:
+    try:
+        lock.release()
+    except LockError:
+        # El lock expiró mientras se generaba el reporte
+        pass
+
+@contextmanager
+def coalesced(task: Any, report_id: int, token: Optional[int]) -> Iterator[bool]:
+    """
+    Ejecutar la generación de un reporte con un lock por reporte en Redis.
+    Entrega False si la tarea fue reemplazada por una solicitud más reciente.
+    Si otra tarea está generando el mismo reporte, se reintenta más tarde.
+    Las tareas sin token (llamadas directas) no se coalescen.
+    """
+    if token is not None and not is_latest(report_id, token):
+        yield False
+        return
+
+    lock = acquire_lock(report_id)
+    if lock is None:
+        raise task.retry(countdown=settings.REPORT_DEBOUNCE_SECONDS, max_retries=None)
+    try:
+        yield token is None or is_latest(report_id, token)
+    finally:
+        release_lock(lock)
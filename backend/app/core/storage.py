@@ -0,0 +1,780 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from app.core import dtypes
+from app.core.config import settings
+
+# Los datos de cada estadística se guardan en archivos Parquet columnares
+# bajo {UPLOAD_DIR}/statistics/{statistic_id}/. Cada versión tiene un
+# manifiesto v{version}.json que lista los segmentos (segments/*.parquet) que
+# la forman y las filas eliminadas de cada uno. Los segmentos se nombran por
+# el hash de su contenido, así las versiones comparten los que no cambian y
+# todas las versiones se conservan sin copiar sus datos.
+STORAGE_DIR = Path(settings.UPLOAD_DIR) / "statistics"
+SEGMENTS_DIR = "segments"
+SEGMENT_GRACE_SECONDS = 3600
+ROW_GROUP_SIZE = 10_000
+CHUNK_ROWS = 100_000  # Filas por segmento al escribir una versión completa; múltiplo de ROW_GROUP_SIZE
+
+def statistic_dir(statistic_id: int) -> Path:
+    return STORAGE_DIR / str(statistic_id)
+
+def manifest_path(statistic_id: int, version: int) -> Path:
+    return statistic_dir(statistic_id) / f"v{version}.json"
+
+def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Preparar un DataFrame para Parquet: nombres de columna como texto y
+    columnas de tipos mixtos convertidas a texto
+    """
+    df = df.copy()
+    df.columns = [str(column) for column in df.columns]
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[column] = df[column].map(lambda value: None if pd.isna(value) else str(value))
+    return df
+
+def widen_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Esquema del archivo a partir del primer bloque. Los números se amplían a
+    float64, las columnas con diccionario a sus valores y las columnas sin
+    valores a texto, porque los bloques siguientes pueden traer celdas vacías
+    o texto en esas columnas. Los tipos compactos se infieren al final.
+    """
+    fields = []
+    for field in schema:
+        if pa.types.is_null(field.type) or pa.types.is_large_string(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            field = field.with_type(pa.float64())
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+class ColumnMismatch(ValueError):
+    """
+    Un bloque trae en una columna valores que no caben en el tipo que le
+    dieron los bloques anteriores
+    """
+    def __init__(self, column: str):
+        super().__init__(f"La columna {column} trae valores que no caben en su tipo")
+        self.column = column
+
+def conform_chunk(df: Union[pd.DataFrame, pa.Table], schema: pa.Schema) -> pa.Table:
+    """
+    Convertir un bloque al esquema del archivo. Los valores que se pueden
+    interpretar en el tipo de su columna (por ejemplo números escritos como
+    texto) se convierten; si alguno no se puede, se lanza ColumnMismatch en
+    lugar de dejarlo nulo. Los bloques que ya vienen en formato Arrow (CSV y
+    Parquet) solo se convierten a los tipos del esquema.
+    """
+    if isinstance(df, pa.Table):
+        arrays = []
+        for field in schema:
+            try:
+                arrays.append(df.column(field.name).cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                if pa.types.is_string(field.type):
+                    raise
+                raise ColumnMismatch(field.name)
+        return pa.Table.from_arrays(arrays, schema=schema)
+    arrays = []
+    for field in schema:
+        column = df[field.name] if field.name in df.columns else pd.Series([None] * len(df))
+        try:
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+            continue
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        if pa.types.is_string(field.type):
+            column = column.map(lambda value: None if pd.isna(value) else str(value))
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+            continue
+        try:
+            if pa.types.is_floating(field.type):
+                converted = pd.to_numeric(column, errors="coerce")
+            elif pa.types.is_timestamp(field.type):
+                converted = pd.to_datetime(column, errors="coerce")
+            else:
+                raise ColumnMismatch(field.name)
+            if (converted.isna() & column.notna()).any():
+                raise ColumnMismatch(field.name)
+            arrays.append(pa.array(converted, type=field.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError) as e:
+            if isinstance(e, ColumnMismatch):
+                raise
+            raise ColumnMismatch(field.name) from e
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def text_array(array: pa.Array) -> pa.Array:
+    """
+    Valores de una columna como texto; las fechas con el mismo formato que str(pd.Timestamp)
+    """
+    if pa.types.is_timestamp(array.type):
+        return pc.strftime(array.cast(pa.timestamp("s"), safe=False), format="%Y-%m-%d %H:%M:%S")
+    return array.cast(pa.string())
+
+def widen_raw_file(path: Path, schema: pa.Schema, column: str) -> Tuple[pq.ParquetWriter, pa.Schema]:
+    """
+    Reescribir lo ya escrito en el archivo sin comprimir con una columna
+    convertida a texto. Retorna el escritor abierto para seguir agregando
+    bloques y el nuevo esquema.
+    """
+    index = schema.get_field_index(column)
+    schema = schema.set(index, schema.field(index).with_type(pa.string()))
+    old_path = path.with_suffix(".old")
+    path.replace(old_path)
+    try:
+        writer = pq.ParquetWriter(path, schema, compression="none")
+        for batch in pq.ParquetFile(old_path).iter_batches(batch_size=ROW_GROUP_SIZE):
+            arrays = list(batch.columns)
+            arrays[index] = text_array(arrays[index])
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=ROW_GROUP_SIZE)
+    finally:
+        old_path.unlink(missing_ok=True)
+    return writer, schema
+
+def write_raw_chunks(path: Path, chunks: Iterable[Union[pd.DataFrame, pa.Table]]) -> int:
+    """
+    Escribir bloques en un archivo Parquet sin comprimir, con los tipos amplios
+    del primer bloque y sin tener todas las filas en memoria. Los bloques
+    pueden ser DataFrames o tablas Arrow. Si un bloque posterior trae en una
+    columna valores que no caben en su tipo, la columna pasa a ser de texto
+    (se reescribe lo ya escrito), así ningún valor se pierde. Retorna las filas escritas.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                chunk = normalize_dataframe(chunk)
+            if writer is None:
+                first = chunk if isinstance(chunk, pa.Table) else pa.Table.from_pandas(chunk, preserve_index=False)
+                schema = widen_schema(first.schema)
+                writer = pq.ParquetWriter(path, schema, compression="none")
+            while True:
+                try:
+                    table = conform_chunk(chunk, schema)
+                    break
+                except ColumnMismatch as e:
+                    writer.close()
+                    writer = None
+                    writer, schema = widen_raw_file(path, schema, e.column)
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            rows += table.num_rows
+        if writer is None:
+            pq.write_table(pa.table({}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def exact_batches(batches: Iterable[pa.RecordBatch], size: int) -> Iterator[pa.RecordBatch]:
+    """
+    Reagrupar lotes en lotes de exactamente size filas (salvo el último), para
+    que los mismos datos queden en los mismos segmentos sin importar en qué
+    bloques se leyó el archivo
+    """
+    pending: List[pa.RecordBatch] = []
+    count = 0
+    for batch in batches:
+        pending.append(batch)
+        count += batch.num_rows
+        while count >= size:
+            table = pa.Table.from_batches(pending).combine_chunks()
+            yield from table.slice(0, size).to_batches()
+            pending = table.slice(size).to_batches()
+            count -= size
+    if count:
+        yield from pa.Table.from_batches(pending).combine_chunks().to_batches()
+
+def segment_tmp_path(statistic_id: int) -> Path:
+    path = statistic_dir(statistic_id) / SEGMENTS_DIR / f"{uuid.uuid4().hex}.tmp"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def store_segment(statistic_id: int, path: Path, rows: int) -> Dict[str, Any]:
+    """
+    Guardar un archivo recién escrito como segmento, nombrado por el hash de
+    su contenido; si otra versión ya tiene un segmento idéntico se reutiliza.
+    El segmento no es visible hasta que un manifiesto lo referencia.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    name = f"{SEGMENTS_DIR}/{digest.hexdigest()}.parquet"
+    target = statistic_dir(statistic_id) / name
+    if target.exists():
+        path.unlink()
+        # Un segmento sin referencias que se vuelve a usar no debe alcanzar a limpiarse
+        os.utime(target)
+    else:
+        path.replace(target)
+    return {"file": name, "rows": rows, "deleted": []}
+
+def write_segment(statistic_id: int, table: pa.Table) -> Dict[str, Any]:
+    """
+    Escribir filas como un segmento
+    """
+    path = segment_tmp_path(statistic_id)
+    try:
+        pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        return store_segment(statistic_id, path, table.num_rows)
+    finally:
+        path.unlink(missing_ok=True)
+
+def write_compact_segments(statistic_id: int, source: Path) -> List[Dict[str, Any]]:
+    """
+    Reescribir un archivo con el esquema compacto inferido de todos sus datos
+    (enteros del menor tamaño posible, float32 cuando no pierde precisión,
+    fechas reales y codificación de diccionario para textos repetidos),
+    dividido en segmentos de CHUNK_ROWS filas. Se recorre dos veces por
+    lotes, así la memoria no depende del tamaño.
+    """
+    parquet_file = pq.ParquetFile(source)
+    profile = dtypes.SchemaProfile(parquet_file.schema_arrow)
+    for batch in parquet_file.iter_batches(batch_size=ROW_GROUP_SIZE):
+        profile.update(batch)
+    schema = profile.target_schema()
+
+    segments = []
+    writer = None
+    path = None
+    rows = 0
+    try:
+        for batch in exact_batches(parquet_file.iter_batches(batch_size=ROW_GROUP_SIZE), ROW_GROUP_SIZE):
+            if writer is None:
+                path = segment_tmp_path(statistic_id)
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(pa.Table.from_batches([profile.convert(batch, schema)]))
+            rows += batch.num_rows
+            if rows >= CHUNK_ROWS:
+                writer.close()
+                writer = None
+                segments.append(store_segment(statistic_id, path, rows))
+                rows = 0
+        if writer is not None:
+            writer.close()
+            writer = None
+            segments.append(store_segment(statistic_id, path, rows))
+    finally:
+        if writer is not None:
+            writer.close()
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    if not segments:
+        segments.append(write_segment(statistic_id, schema.empty_table()))
+    return segments
+
+def write_statistic_chunks(
+    statistic_id: int,
+    version: int,
+    chunks: Iterable[Union[pd.DataFrame, pa.Table]],
+    key: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Escribir los datos completos de una versión. Los bloques se escriben
+    primero sin comprimir y luego se compactan en segmentos; los segmentos
+    idénticos a los de otra versión no se duplican. Retorna el resumen para
+    Statistic.data.
+    """
+    raw_path = segment_tmp_path(statistic_id).with_suffix(".raw")
+    try:
+        write_raw_chunks(raw_path, chunks)
+        segments = write_compact_segments(statistic_id, raw_path)
+    finally:
+        raw_path.unlink(missing_ok=True)
+    return save_version(statistic_id, version, segments, key)
+
+def load_manifest(statistic_id: int, version: int) -> Dict[str, Any]:
+    """
+    Segmentos que forman una versión, con las filas eliminadas de cada uno
+    """
+    return json.loads(manifest_path(statistic_id, version).read_text())
+
+def save_manifest(statistic_id: int, manifest: Dict[str, Any]) -> None:
+    path = manifest_path(statistic_id, manifest["version"])
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    tmp_path.replace(path)
+
+def save_version(
+    statistic_id: int, version: int, segments: List[Dict[str, Any]], key: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Guardar el manifiesto de una versión formada por segmentos. Retorna el resumen para Statistic.data.
+    """
+    save_manifest(statistic_id, {"version": version, "key": key, "segments": segments})
+    first = statistic_dir(statistic_id) / segments[0]["file"]
+    deleted = sum(len(segment["deleted"]) for segment in segments)
+    return {
+        "storage": "parquet",
+        "version": version,
+        "rows": sum(segment["rows"] for segment in segments) - deleted,
+        "columns": pq.read_schema(first).names,
+        "segments": len(segments),
+        "deleted_rows": deleted,
+    }
+
+def iter_segment_files(statistic_id: int, version: int) -> Iterator[Tuple[pq.ParquetFile, Optional[np.ndarray]]]:
+    """
+    Archivos de los segmentos de una versión con la máscara de sus filas
+    vigentes (None si el segmento no tiene filas eliminadas)
+    """
+    for segment in load_manifest(statistic_id, version)["segments"]:
+        parquet_file = pq.ParquetFile(statistic_dir(statistic_id) / segment["file"])
+        mask = None
+        if segment["deleted"]:
+            mask = np.ones(parquet_file.metadata.num_rows, dtype=bool)
+            mask[segment["deleted"]] = False
+        yield parquet_file, mask
+
+def statistic_file(statistic_id: int, version: int) -> Optional[Path]:
+    """
+    Archivo con todos los datos de la versión, si está guardada en uno solo sin filas eliminadas
+    """
+    segments = load_manifest(statistic_id, version)["segments"]
+    if len(segments) == 1 and not segments[0]["deleted"]:
+        return statistic_dir(statistic_id) / segments[0]["file"]
+    return None
+
+def read_statistic_table(
+    statistic_id: int, version: int, columns: Optional[List[str]] = None
+) -> pa.Table:
+    tables = []
+    for parquet_file, mask in iter_segment_files(statistic_id, version):
+        table = parquet_file.read(columns=columns)
+        tables.append(table if mask is None else table.filter(pa.array(mask)))
+    return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+def read_statistic_schema(statistic_id: int, version: int) -> List[Dict[str, str]]:
+    """
+    Esquema de los datos guardados, desde el pie del archivo Parquet
+    """
+    parquet_file, _ = next(iter_segment_files(statistic_id, version))
+    return dtypes.describe_schema(parquet_file.schema_arrow)
+
+def table_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """
+    Convertir a DataFrame conservando los tipos compactos: las columnas con
+    diccionario quedan como categóricas y las fechas como datetime64
+    """
+    return table.to_pandas(date_as_object=False)
+
+def decode_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    categorical = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.astype({column: object for column in categorical})
+
+def read_statistic_data(
+    statistic_id: int, version: int, columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Leer los datos de una estadística como DataFrame
+    """
+    return table_to_dataframe(read_statistic_table(statistic_id, version, columns))
+
+def iter_statistic_batches(
+    statistic_id: int,
+    version: int,
+    columns: Optional[List[str]] = None,
+    batch_size: int = ROW_GROUP_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Recorrer los datos de una estadística por lotes, sin cargarlos completos
+    """
+    for parquet_file, mask in iter_segment_files(statistic_id, version):
+        start = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            end = start + batch.num_rows
+            if mask is not None:
+                batch = batch.filter(pa.array(mask[start:end]))
+            start = end
+            if batch.num_rows:
+                yield batch
+
+def iter_statistic_frames(statistic_id: int, version: int) -> Iterator[pd.DataFrame]:
+    """
+    Lotes de una versión como DataFrames con los valores de las categóricas,
+    para volver a escribirlos con write_chunks
+    """
+    for batch in iter_statistic_batches(statistic_id, version):
+        yield decode_categoricals(table_to_dataframe(pa.Table.from_batches([batch])))
+
+def read_file_rows(
+    parquet_file: pq.ParquetFile, offset: int, limit: int, columns: Optional[List[str]] = None
+) -> pa.Table:
+    """
+    Leer un rango de filas usando los metadatos de los row groups del archivo,
+    de modo que solo se decodifican los row groups que cubren el rango pedido
+    """
+    metadata = parquet_file.metadata
+
+    row_groups = []
+    first_row = None
+    start = 0
+    for index in range(metadata.num_row_groups):
+        num_rows = metadata.row_group(index).num_rows
+        end = start + num_rows
+        if end > offset and start < offset + limit:
+            if first_row is None:
+                first_row = start
+            row_groups.append(index)
+        start = end
+
+    if not row_groups:
+        return parquet_file.schema_arrow.empty_table().select(
+            columns or parquet_file.schema_arrow.names
+        )
+
+    table = parquet_file.read_row_groups(row_groups, columns=columns)
+    return table.slice(offset - first_row, limit)
+
+def read_statistic_rows(
+    statistic_id: int,
+    version: int,
+    offset: int,
+    limit: int,
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Leer un rango de filas recorriendo los segmentos de la versión; en los
+    segmentos sin filas eliminadas solo se leen los row groups necesarios
+    """
+    tables = []
+    empty = None
+    for parquet_file, mask in iter_segment_files(statistic_id, version):
+        if empty is None:
+            empty = parquet_file.schema_arrow.empty_table().select(
+                columns or parquet_file.schema_arrow.names
+            )
+        live_rows = parquet_file.metadata.num_rows if mask is None else int(mask.sum())
+        if offset >= live_rows:
+            offset -= live_rows
+            continue
+        if mask is None:
+            table = read_file_rows(parquet_file, offset, limit, columns)
+        else:
+            table = parquet_file.read(columns=columns).filter(pa.array(mask)).slice(offset, limit)
+        tables.append(table)
+        offset = 0
+        limit -= table.num_rows
+        if limit <= 0:
+            break
+
+    if not tables:
+        return table_to_dataframe(empty)
+    return table_to_dataframe(tables[0] if len(tables) == 1 else pa.concat_tables(tables))
+
+def check_columns(df: pd.DataFrame, names: List[str], key: Optional[List[str]] = None) -> None:
+    unknown = set(df.columns) - set(names)
+    if unknown:
+        raise ValueError(f"Columnas inexistentes: {', '.join(sorted(map(str, unknown)))}")
+    missing_key = set(key or []) - set(df.columns)
+    if missing_key:
+        raise ValueError(f"Faltan columnas clave: {', '.join(sorted(missing_key))}")
+
+def append_statistic_rows(
+    statistic_id: int, version: int, new_version: int, df: pd.DataFrame
+) -> Dict[str, Any]:
+    """
+    Agregar filas creando una versión que reutiliza los segmentos de la
+    anterior y agrega uno solo con las filas nuevas. Si las filas no caben en
+    los tipos guardados (por ejemplo un entero fuera de rango) la versión se
+    reescribe completa con un esquema inferido nuevamente.
+    """
+    manifest = load_manifest(statistic_id, version)
+    parquet_file, _ = next(iter_segment_files(statistic_id, version))
+    schema = parquet_file.schema_arrow
+    check_columns(df, schema.names)
+    try:
+        table = dtypes.conform_frame(df, schema)
+    except ValueError:
+        chunks = itertools.chain(iter_statistic_frames(statistic_id, version), [df])
+        return write_statistic_chunks(statistic_id, new_version, chunks, manifest.get("key"))
+    segments = manifest["segments"] + [write_segment(statistic_id, table)]
+    return save_version(statistic_id, new_version, segments, manifest.get("key"))
+
+def key_index(df: pd.DataFrame, key: List[str]) -> pd.MultiIndex:
+    return pd.MultiIndex.from_frame(decode_categoricals(df[key]))
+
+def index_by_key(df: pd.DataFrame, key: List[str]) -> pd.DataFrame:
+    return df.drop(columns=key).set_index(key_index(df, key))
+
+def unchanged_keys(existing: pd.DataFrame, new: pd.DataFrame, key: List[str]) -> pd.MultiIndex:
+    """
+    Claves cuya fila guardada es idéntica a la enviada. Las claves repetidas
+    en los datos guardados se consideran cambiadas.
+    """
+    if existing.empty:
+        return key_index(new.iloc[:0], key)
+    new_keys = key_index(new, key)
+    existing = index_by_key(existing.drop_duplicates(subset=key, keep=False), key)
+    new = index_by_key(new, key)
+    found = new_keys.isin(key_index(existing.reset_index(), key))
+    old_values = existing.loc[new.index[found], new.columns]
+    new_values = new[found]
+    same = ((old_values.to_numpy() == new_values.to_numpy()) | (old_values.isna() & new_values.isna()).to_numpy()).all(axis=1)
+    return new_keys[found][same]
+
+def upsert_statistic_rows(
+    statistic_id: int, version: int, new_version: int, df: pd.DataFrame, key: List[str]
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    """
+    Insertar o reemplazar filas según las columnas clave, escribiendo solo las
+    filas nuevas o con cambios: las filas reemplazadas se marcan como
+    eliminadas en el manifiesto de la nueva versión y las enviadas se agregan
+    en un segmento nuevo. Las columnas que no se envían quedan vacías.
+    Retorna el resumen (None si ninguna fila cambia) y los conteos de filas
+    insertadas, actualizadas y sin cambios.
+    """
+    manifest = load_manifest(statistic_id, version)
+    segments = [dict(segment) for segment in manifest["segments"]]
+    parquet_file, _ = next(iter_segment_files(statistic_id, version))
+    schema = parquet_file.schema_arrow
+    check_columns(df, schema.names, key)
+    df = df.drop_duplicates(subset=key, keep="last")
+
+    try:
+        table = dtypes.conform_frame(df, schema)
+        new_rows = decode_categoricals(table_to_dataframe(table))
+    except ValueError:
+        # Al menos las claves deben tener los tipos guardados para encontrar las filas
+        table = None
+        new_rows = df.reset_index(drop=True)
+        try:
+            keys = dtypes.conform_frame(df[key], pa.schema([schema.field(name) for name in key]))
+            new_rows[key] = decode_categoricals(table_to_dataframe(keys))
+        except ValueError:
+            pass
+    new_keys = key_index(new_rows, key)
+
+    # Filas vigentes con las mismas claves, por segmento
+    matches = []
+    for index, (segment_file, mask) in enumerate(iter_segment_files(statistic_id, version)):
+        hits = key_index(table_to_dataframe(segment_file.read(columns=key)), key).isin(new_keys)
+        if mask is not None:
+            hits &= mask
+        positions = np.flatnonzero(hits)
+        if len(positions):
+            rows = decode_categoricals(table_to_dataframe(segment_file.read().take(pa.array(positions))))
+            matches.append((index, positions, rows))
+    existing = pd.concat([rows for _, _, rows in matches], ignore_index=True) if matches else new_rows.iloc[:0]
+
+    changed = ~new_keys.isin(unchanged_keys(existing, new_rows, key))
+    inserted = int((~new_keys.isin(key_index(existing, key))).sum())
+    counts = {
+        "inserted": inserted,
+        "updated": int(changed.sum()) - inserted,
+        "unchanged": int((~changed).sum()),
+    }
+    if not changed.any():
+        return None, counts
+
+    changed_keys = new_keys[changed]
+    for index, positions, rows in matches:
+        replaced = positions[key_index(rows, key).isin(changed_keys)]
+        segments[index]["deleted"] = sorted(set(segments[index]["deleted"]) | set(replaced.tolist()))
+
+    if table is None:
+        # Las filas no caben en los tipos guardados: se reescribe la versión completa
+        save_manifest(statistic_id, {"version": new_version, "key": key, "segments": segments})
+        try:
+            chunks = itertools.chain(iter_statistic_frames(statistic_id, new_version), [new_rows[changed]])
+            return write_statistic_chunks(statistic_id, new_version, chunks, key), counts
+        except Exception:
+            manifest_path(statistic_id, new_version).unlink(missing_ok=True)
+            raise
+
+    segments.append(write_segment(statistic_id, table.filter(pa.array(changed))))
+    return save_version(statistic_id, new_version, segments, key), counts
+
+def is_compact(segments: List[Dict[str, Any]]) -> bool:
+    """
+    Si la versión está escrita en segmentos completos de CHUNK_ROWS filas, sin filas eliminadas
+    """
+    if any(segment["deleted"] for segment in segments):
+        return False
+    return len(segments) == 1 or all(segment["rows"] == CHUNK_ROWS for segment in segments[:-1])
+
+def needs_compaction(summary: Dict[str, Any]) -> bool:
+    chunks = max(1, -(-summary.get("rows", 0) // CHUNK_ROWS))
+    if summary.get("segments", 1) > chunks + settings.STATISTIC_MAX_SEGMENTS:
+        return True
+    total = summary.get("rows", 0) + summary.get("deleted_rows", 0)
+    return bool(total) and summary.get("deleted_rows", 0) / total > settings.STATISTIC_MAX_DELETED_RATIO
+
+def compact_statistic_version(statistic_id: int, version: int) -> Optional[Dict[str, Any]]:
+    """
+    Reescribir una versión formada por muchos segmentos o con filas
+    eliminadas en segmentos completos, con el esquema inferido nuevamente.
+    Los datos de la versión no cambian y las demás versiones conservan sus
+    segmentos. Retorna el nuevo resumen o None si la versión ya estaba compacta.
+    """
+    manifest = load_manifest(statistic_id, version)
+    if is_compact(manifest["segments"]):
+        return None
+    summary = write_statistic_chunks(
+        statistic_id, version, iter_statistic_frames(statistic_id, version), manifest.get("key")
+    )
+    prune_segments(statistic_id)
+    return summary
+
+def prune_segments(statistic_id: int) -> None:
+    """
+    Eliminar los segmentos que ningún manifiesto referencia y los archivos
+    temporales que quedaron de escrituras interrumpidas. Los archivos
+    recientes se conservan porque pueden pertenecer a una versión que se está escribiendo.
+    """
+    directory = statistic_dir(statistic_id)
+    referenced = set()
+    for path in directory.glob("v*.json"):
+        referenced.update(segment["file"] for segment in json.loads(path.read_text())["segments"])
+    threshold = time.time() - SEGMENT_GRACE_SECONDS
+    segments_dir = directory / SEGMENTS_DIR
+    if not segments_dir.exists():
+        return
+    for path in segments_dir.iterdir():
+        if f"{SEGMENTS_DIR}/{path.name}" not in referenced and path.stat().st_mtime < threshold:
+            path.unlink(missing_ok=True)
+
+def version_exists(statistic_id: int, version: int) -> bool:
+    return manifest_path(statistic_id, version).exists()
+
+def rows_only_in(statistic_id: int, manifest: Dict[str, Any], other: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Filas vigentes de una versión que no están vigentes en otra, comparando
+    por segmento: los segmentos que ambas comparten con las mismas filas
+    eliminadas no se leen
+    """
+    shared: Dict[str, List[set]] = {}
+    for segment in other["segments"]:
+        shared.setdefault(segment["file"], []).append(set(segment["deleted"]))
+
+    tables = []
+    schema = None
+    for segment in manifest["segments"]:
+        deleted = set(segment["deleted"])
+        candidates = shared.get(segment["file"], [])
+        if deleted in candidates:
+            candidates.remove(deleted)
+            continue
+        parquet_file = pq.ParquetFile(statistic_dir(statistic_id) / segment["file"])
+        schema = schema or parquet_file.schema_arrow
+        mask = np.ones(parquet_file.metadata.num_rows, dtype=bool)
+        mask[sorted(deleted)] = False
+        if candidates:
+            # El mismo segmento con otras filas eliminadas: solo difieren esas filas
+            deleted_there = np.zeros(len(mask), dtype=bool)
+            deleted_there[sorted(candidates.pop(0))] = True
+            mask &= deleted_there
+        if mask.any():
+            tables.append(parquet_file.read().filter(pa.array(mask)))
+
+    if not tables:
+        first = manifest["segments"][0]["file"]
+        schema = schema or pq.read_schema(statistic_dir(statistic_id) / first)
+        tables.append(schema.empty_table())
+    table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+    return decode_categoricals(table_to_dataframe(table))
+
+def multiset_difference(
+    left: pd.DataFrame, right: pd.DataFrame, columns: List[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Filas de left que no están en right y viceversa, comparando los valores
+    de las columnas dadas y contando las filas repetidas
+    """
+    if not columns or left.empty or right.empty:
+        return left, right
+    left_values = left[columns].assign(_repeat=left.groupby(columns, dropna=False).cumcount().to_numpy())
+    right_values = right[columns].assign(_repeat=right.groupby(columns, dropna=False).cumcount().to_numpy())
+    for column in columns:
+        # Una columna puede haber cambiado de tipo entre versiones
+        if left_values[column].dtype != right_values[column].dtype:
+            left_values[column] = left_values[column].astype(object)
+            right_values[column] = right_values[column].astype(object)
+    merged = left_values.assign(_left=np.arange(len(left))).merge(
+        right_values.assign(_right=np.arange(len(right))),
+        on=columns + ["_repeat"],
+        how="outer",
+    )
+    only_left = merged["_right"].isna()
+    only_right = merged["_left"].isna()
+    return (
+        left.iloc[merged.loc[only_left, "_left"].astype(int)],
+        right.iloc[merged.loc[only_right, "_right"].astype(int)],
+    )
+
+def diff_statistic_versions(
+    statistic_id: int, from_version: int, to_version: int, key: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Diferencias entre dos versiones: columnas agregadas y quitadas, filas
+    agregadas y eliminadas y, si se indican columnas clave, filas cuyos
+    valores cambiaron (con sus valores anteriores). Solo se leen los
+    segmentos que no comparten. Las filas se comparan en las columnas que
+    ambas versiones tienen; sin clave, como conjuntos de filas con repetición.
+    """
+    old_manifest = load_manifest(statistic_id, from_version)
+    new_manifest = load_manifest(statistic_id, to_version)
+    old = rows_only_in(statistic_id, old_manifest, new_manifest)
+    new = rows_only_in(statistic_id, new_manifest, old_manifest)
+    columns = [column for column in new.columns if column in old.columns]
+    result = {
+        "columns_added": [column for column in new.columns if column not in old.columns],
+        "columns_removed": [column for column in old.columns if column not in new.columns],
+    }
+
+    if not key:
+        removed, added = multiset_difference(old, new, columns)
+        return {**result, "added": added, "removed": removed, "changed": new.iloc[:0], "previous": old.iloc[:0]}
+
+    missing_key = set(key) - set(columns)
+    if missing_key:
+        raise ValueError(f"Columnas clave inexistentes: {', '.join(sorted(missing_key))}")
+    # Con claves repetidas se compara la última fila de cada clave
+    old = old.drop_duplicates(subset=key, keep="last")
+    new = new.drop_duplicates(subset=key, keep="last")
+    old_keys = key_index(old, key)
+    new_keys = key_index(new, key)
+    same = unchanged_keys(old[columns], new[columns], key)
+    changed = new_keys.isin(old_keys) & ~new_keys.isin(same)
+    return {
+        **result,
+        "added": new[~new_keys.isin(old_keys)],
+        "removed": old[~old_keys.isin(new_keys)],
+        "changed": new[changed],
+        "previous": old.iloc[old_keys.get_indexer(new_keys[changed])],
+    }
+
+def delete_statistic_data(statistic_id: int) -> None:
+    shutil.rmtree(statistic_dir(statistic_id), ignore_errors=True)
+
+def dataframe_to_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """
+    Convertir un DataFrame a un diccionario {columna: valores} apto para JSON
+    """
+    return df.astype(object).where(df.notna(), None).to_dict(orient="list")
@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+import hashlib
+import json
+import logging
+
+import pandas as pd
+import pyarrow as pa
+
+from app.core import query, storage
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHART_TYPES = {"line", "bar"}
+TABLE_ROW_LIMIT = 100
+
+# Lectura de Parquet y operaciones de pandas liberan el GIL en buena parte
+executor = ThreadPoolExecutor(max_workers=settings.DASHBOARD_WORKERS)
+
+def iter_widgets(widgets: Any) -> List[Dict[str, Any]]:
+    """
+    Lista de widgets de una configuración. Se aceptan una lista, un objeto
+    {"items": [...]} o un objeto con los widgets indexados por id.
+    """
+    if isinstance(widgets, list):
+        return [widget for widget in widgets if isinstance(widget, dict)]
+    if isinstance(widgets, dict):
+        if isinstance(widgets.get("items"), list):
+            return iter_widgets(widgets["items"])
+        result = []
+        for widget_id, widget in widgets.items():
+            if isinstance(widget, dict):
+                result.append({"id": widget_id, **widget})
+        return result
+    return []
+
+def widget_statistic_id(widget: Dict[str, Any]) -> Optional[int]:
+    value = widget.get("statisticId", widget.get("statistic_id"))
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def widget_hash(widget: Dict[str, Any]) -> str:
+    """
+    Hash de lo que determina los datos de un widget (tipo, estadística y
+    configuración); cambios de posición o título no lo alteran
+    """
+    relevant = {
+        "type": widget.get("type"),
+        "statistic_id": widget_statistic_id(widget),
+        "config": widget.get("config") or {},
+    }
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+def widget_fields(widget: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Campos que usa el widget: x (categorías), y (valores), agregación y límite
+    """
+    config = widget.get("config") or {}
+    x = config.get("xField") or config.get("labelField") or config.get("x")
+    y = config.get("yFields") or config.get("valueField") or config.get("y") or []
+    if isinstance(y, str):
+        y = [y]
+    return {
+        "x": x,
+        "y": list(y),
+        "aggregation": config.get("aggregation", "sum"),
+        "columns": config.get("columns") or [],
+        "limit": config.get("limit"),
+        "sort": config.get("sort"),
+    }
+
+def widget_columns(widget: Dict[str, Any]) -> Optional[Set[str]]:
+    """
+    Columnas de la estadística que necesita el widget; None significa todas
+    """
+    fields = widget_fields(widget)
+    if widget.get("type") == "table":
+        return set(fields["columns"]) or None
+    columns = set(fields["y"])
+    if fields["x"]:
+        columns.add(fields["x"])
+    return columns
+
+def compute_widget_series(widget: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Calcular los datos de un widget en el formato que usa su gráfico:
+    line/bar -> labels + series, pie -> labels + values, table -> columns + rows
+    """
+    widget_type = widget.get("type")
+    fields = widget_fields(widget)
+
+    if widget_type == "table":
+        columns = fields["columns"] or [str(column) for column in df.columns]
+        limit = fields["limit"] or TABLE_ROW_LIMIT
+        table = df[columns].head(limit)
+        return {
+            "columns": columns,
+            "rows": table.astype(object).where(table.notna(), None).values.tolist(),
+        }
+
+    if not fields["x"] or not fields["y"]:
+        raise ValueError("El widget debe definir xField y yFields")
+
+    aggregations = query.parse_aggregations([f"{column}:{fields['aggregation']}" for column in fields["y"]])
+    sort = query.parse_sort([fields["sort"]]) if fields["sort"] else [(fields["x"], True)]
+    result = query.run_query(df, [fields["x"]], aggregations, [], sort, fields["limit"])
+    labels = storage.dataframe_to_columns(result[[fields["x"]]])[fields["x"]]
+    values = storage.dataframe_to_columns(result.drop(columns=[fields["x"]]))
+
+    if widget_type == "pie":
+        return {"labels": labels, "values": next(iter(values.values()))}
+    if widget_type in CHART_TYPES:
+        return {
+            "labels": labels,
+            "series": [
+                {"name": column, "data": values[f"{column}_{fields['aggregation']}"]}
+                for column in fields["y"]
+            ],
+        }
+    raise ValueError(f"Tipo de widget no soportado: {widget_type}")
+
+def required_columns(
+    widgets: List[Dict[str, Any]], available: Dict[int, List[str]]
+) -> Dict[int, Optional[List[str]]]:
+    """
+    Unión de las columnas que piden los widgets de cada estadística, para
+    leer cada estadística una sola vez
+    """
+    columns: Dict[int, Optional[Set[str]]] = {}
+    for widget in widgets:
+        statistic_id = widget_statistic_id(widget)
+        if statistic_id not in available:
+            continue
+        needed = widget_columns(widget)
+        if needed is None or (statistic_id in columns and columns[statistic_id] is None):
+            columns[statistic_id] = None
+        else:
+            columns[statistic_id] = columns.get(statistic_id, set()) | needed
+    return {
+        statistic_id: None if needed is None else [c for c in available[statistic_id] if c in needed]
+        for statistic_id, needed in columns.items()
+    }
+
+def resolve_widgets(
+    widgets: List[Dict[str, Any]], statistics: Dict[int, Tuple[int, List[str]]]
+) -> List[Dict[str, Any]]:
+    """
+    Calcular en paralelo los datos de todos los widgets de un dashboard.
+    statistics: {statistic_id: (versión, columnas)} de las estadísticas referenciadas.
+    Los errores de un widget se informan en ese widget sin afectar a los demás.
+    """
+    available = {statistic_id: columns for statistic_id, (_, columns) in statistics.items()}
+    columns = required_columns(widgets, available)
+
+    def load(statistic_id: int) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+        version, _ = statistics[statistic_id]
+        try:
+            return storage.read_statistic_data(statistic_id, version, columns[statistic_id]), None
+        except (OSError, ValueError, pa.ArrowException) as e:
+            # Los widgets de esta estadística informan el error; los demás se calculan igual
+            logger.warning("No se pudieron leer los datos de la estadística %s: %s", statistic_id, e)
+            return None, "No se pudieron leer los datos de la estadística"
+
+    frames = dict(zip(columns, executor.map(load, columns)))
+
+    def compute(widget: Dict[str, Any]) -> Dict[str, Any]:
+        statistic_id = widget_statistic_id(widget)
+        result = {
+            "id": str(widget.get("id")),
+            "type": widget.get("type"),
+            "statistic_id": statistic_id,
+            "version": statistics[statistic_id][0] if statistic_id in statistics else None,
+            "data": None,
+            "error": None,
+        }
+        if statistic_id not in frames:
+            result["error"] = "Estadística no encontrada"
+            return result
+        df, error = frames[statistic_id]
+        if error is not None:
+            result["error"] = error
+            return result
+        try:
+            result["data"] = compute_widget_series(widget, df)
+        except (KeyError, ValueError, TypeError) as e:
+            result["error"] = str(e)
+        return result
+
+    return list(executor.map(compute, widgets))
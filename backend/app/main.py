@@ -3,6 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from typing import Dict, Any
+import anyio
+
+from app.core.config import settings
 
 # Importación de rutas
 from app.api.v1 import auth, dashboard, reports, data
@@ -22,6 +25,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def configure_threadpool() -> None:
+    # Los endpoints síncronos corren en este pool de hilos
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+
 # Manejo de errores de validación
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, JSON, ForeignKey, Boolean, Integer
+from sqlalchemy import Column, String, JSON, ForeignKey, Boolean, Integer, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import BaseModel
 
@@ -12,4 +12,20 @@ class DashboardConfig(BaseModel):
     
     # Relaciones
     user_id = Column(Integer, ForeignKey("users.id"))
-    user = relationship("User", back_populates="dashboard_configs") 
\ No newline at end of file
+    user = relationship("User", back_populates="dashboard_configs")
+
+class WidgetSeries(BaseModel):
+    """
+    Datos precalculados de un widget, válidos mientras no cambien la versión
+    de la estadística ni la configuración del widget
+    """
+    __tablename__ = "widget_series"
+    __table_args__ = (UniqueConstraint("config_id", "widget_id"),)
+
+    config_id = Column(Integer, ForeignKey("dashboard_configs.id", ondelete="CASCADE"), nullable=False)
+    widget_id = Column(String, nullable=False)
+    widget_hash = Column(String, nullable=False)  # Hash de la configuración del widget
+    statistic_id = Column(Integer, index=True)
+    statistic_version = Column(Integer)
+    data = Column(JSON)
+    error = Column(String)
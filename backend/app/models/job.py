@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, ForeignKey, Enum, Integer, BigInteger
+from .base import BaseModel
+import enum
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class IngestJob(BaseModel):
+    __tablename__ = "ingest_jobs"
+
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    file_path = Column(String, nullable=False)  # Copia temporal del archivo subido
+    source_file = Column(String, nullable=False)  # Nombre original del archivo
+    title = Column(String, nullable=False)
+    description = Column(String)
+    category = Column(String, nullable=False)
+    total_bytes = Column(BigInteger, default=0)
+    bytes_read = Column(BigInteger, default=0)
+    rows_parsed = Column(Integer, default=0)
+    error = Column(String)
+    batch_id = Column(String, index=True)  # Carga masiva a la que pertenece el archivo
+    
+    # Relaciones
+    user_id = Column(Integer, ForeignKey("users.id"))
+    statistic_id = Column(Integer, ForeignKey("statistics.id", ondelete="SET NULL"))
@@ -1,15 +1,23 @@
-from sqlalchemy import Column, String, Float, JSON, ForeignKey
+from sqlalchemy import Column, String, Float, JSON, ForeignKey, Integer, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import BaseModel
+import enum
+
+class VersionChange(str, enum.Enum):
+    UPLOAD = "upload"
+    UPDATE = "update"
+    APPEND = "append"
+    UPSERT = "upsert"
 
 class Statistic(BaseModel):
     __tablename__ = "statistics"
 
     title = Column(String, nullable=False)
     description = Column(String)
-    category = Column(String, nullable=False)
-    data = Column(JSON, nullable=False)  # Almacena los datos en formato JSON
-    source_file = Column(String)  # Nombre del archivo Excel de origen
+    category = Column(String, nullable=False, index=True)
+    data = Column(JSON, nullable=False)  # Resumen de los datos; las filas se guardan en app.core.storage
+    version = Column(Integer, nullable=False, default=1)  # Versión vigente de los datos almacenados
+    source_file = Column(String, index=True)  # Nombre del archivo Excel de origen
     metadata = Column(JSON)  # Metadatos adicionales como unidades, fechas, etc.
     
     # Relaciones
@@ -20,4 +28,18 @@ class ReportStatistic(BaseModel):
     __tablename__ = "report_statistics"
 
     report_id = Column(Integer, ForeignKey("reports.id"), primary_key=True)
-    statistic_id = Column(Integer, ForeignKey("statistics.id"), primary_key=True) 
\ No newline at end of file
+    statistic_id = Column(Integer, ForeignKey("statistics.id"), primary_key=True)
+
+class StatisticVersion(BaseModel):
+    """
+    Registro de cada cambio de los datos de una estadística. Los datos de
+    todas las versiones se conservan en app.core.storage.
+    """
+    __tablename__ = "statistic_versions"
+    __table_args__ = (UniqueConstraint("statistic_id", "version"),)
+
+    statistic_id = Column(Integer, ForeignKey("statistics.id", ondelete="CASCADE"), nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    change = Column(Enum(VersionChange), nullable=False)
+    data = Column(JSON, nullable=False)  # Resumen de los datos de la versión
+    user_id = Column(Integer, ForeignKey("users.id"))
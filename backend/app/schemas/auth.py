@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Optional, List
 from app.models.user import UserRole
 
 class Token(BaseModel):
@@ -29,4 +29,8 @@ class User(UserBase):
     id: int
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class UserPage(BaseModel):
+    items: List[User]
+    next_cursor: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 
 class DashboardConfigBase(BaseModel):
@@ -24,4 +24,16 @@ class DashboardConfig(DashboardConfigBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class WidgetData(BaseModel):
+    id: str
+    type: Optional[str] = None
+    statistic_id: Optional[int] = None
+    version: Optional[int] = None
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class DashboardData(BaseModel):
+    config_id: int
+    widgets: List[WidgetData]
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from app.models.job import JobStatus
+
+class IngestJob(BaseModel):
+    id: int
+    status: JobStatus
+    source_file: str
+    title: str
+    category: str
+    total_bytes: int = 0
+    bytes_read: int = 0
+    rows_parsed: int = 0
+    statistic_id: Optional[int] = None
+    error: Optional[str] = None
+    batch_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class IngestBatch(BaseModel):
+    batch_id: str
+    jobs: List[IngestJob]
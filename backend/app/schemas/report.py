@@ -28,4 +28,15 @@ class Report(ReportBase):
     statistics: List[Statistic] = []
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class ReportPage(BaseModel):
+    items: List[Report]
+    next_cursor: Optional[str] = None
+
+class ReportBatchRegenerate(BaseModel):
+    report_ids: List[int]
+
+class ReportBatchJob(BaseModel):
+    report_ids: List[int]
+    task_ids: List[str]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from app.models.statistic import VersionChange
 
 class StatisticBase(BaseModel):
     title: str
@@ -22,8 +23,81 @@ class StatisticUpdate(BaseModel):
 
 class Statistic(StatisticBase):
     id: int
+    version: int = 1
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class StatisticQueryResult(BaseModel):
+    statistic_id: int
+    version: int
+    columns: List[str]
+    rows: int
+    data: Dict[str, List[Any]]
+
+class StatisticRows(BaseModel):
+    statistic_id: int
+    version: int
+    offset: int
+    limit: int
+    total_rows: int
+    columns: List[str]
+    data: Dict[str, List[Any]]
+
+class StatisticRowsAppend(BaseModel):
+    data: Dict[str, List[Any]]
+
+class StatisticRowsUpsert(StatisticRowsAppend):
+    key: List[str]
+
+class StatisticRowsChange(BaseModel):
+    statistic_id: int
+    version: int
+    rows: int
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+class StatisticVersion(BaseModel):
+    version: int
+    change: VersionChange
+    rows: int
+    columns: List[str]
+    user_id: Optional[int] = None
+    created_at: datetime
+
+class StatisticDiffRows(BaseModel):
+    rows: int
+    data: Dict[str, List[Any]]
+
+class StatisticDiff(BaseModel):
+    statistic_id: int
+    from_version: int
+    to_version: int
+    key: List[str] = []
+    columns_added: List[str]
+    columns_removed: List[str]
+    added: StatisticDiffRows
+    removed: StatisticDiffRows
+    changed: StatisticDiffRows
+    previous: StatisticDiffRows
+
+class StatisticSummary(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    category: str
+    source_file: Optional[str] = None
+    version: int = 1
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StatisticList(BaseModel):
+    total: int
+    items: List[StatisticSummary]
+    next_cursor: Optional[str] = None
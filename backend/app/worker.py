@@ -1,68 +1,67 @@
-from typing import List, Dict, Any
-import pandas as pd
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
+import logging
+from openpyxl import Workbook
 from pathlib import Path
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
 
+from app.core import artifacts, cache, dashboards, ingest, regeneration, storage
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import SessionLocal
+from app.models.dashboard import DashboardConfig, WidgetSeries
+from app.models.job import IngestJob, JobStatus
 from app.models.report import Report, ReportType
+from app.models.statistic import Statistic, StatisticVersion, VersionChange
+from app.core.export import sheet_title
 from app.core.pdf import create_html_report, generate_pdf
 
-def get_db() -> Session:
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def get_db() -> Iterator[Session]:
+    """
+    Sesión de base de datos que se cierra al terminar la tarea
+    """
+    db = SessionLocal()
     try:
-        db = SessionLocal()
-        return db
+        yield db
     finally:
         db.close()
 
-@celery_app.task
-def generate_excel_report(report_id: int) -> None:
-    """
-    Tarea Celery para generar reportes Excel
-    """
-    db = get_db()
-    report = db.query(Report).filter(Report.id == report_id).first()
-    if not report or not report.statistics:
-        return
-    
-    # Crear directorio si no existe
-    Path("uploads/reports").mkdir(parents=True, exist_ok=True)
-    
-    # Crear un nuevo archivo Excel
-    writer = pd.ExcelWriter(f"uploads/reports/{report_id}.xlsx", engine='openpyxl')
+def render_excel_report(report: Report, output_path: str) -> None:
+    # Libro en modo write-only: las filas se escriben a disco a medida que se
+    # agregan, así la memoria no crece con el tamaño de las estadísticas
+    workbook = Workbook(write_only=True)
+    used_titles: set = set()
     
     # Para cada estadística en el reporte
     for stat in report.statistics:
-        df = pd.DataFrame(stat.data)
-        df.to_excel(writer, sheet_name=stat.title[:31], index=False)
-    
-    writer.save()
+        sheet = workbook.create_sheet(title=sheet_title(stat.title, used_titles))
+        header_written = False
+        for batch in storage.iter_statistic_batches(stat.id, stat.version):
+            if not header_written:
+                sheet.append(batch.schema.names)
+                header_written = True
+            for row in zip(*(column.to_pylist() for column in batch.columns)):
+                sheet.append(row)
+        if not header_written:
+            sheet.append(stat.data.get("columns", []))
     
-    # Actualizar la ruta del archivo en el reporte
-    report.file_path = f"uploads/reports/{report_id}.xlsx"
-    db.add(report)
-    db.commit()
+    workbook.save(output_path)
 
-@celery_app.task
-def generate_pdf_report(report_id: int) -> None:
-    """
-    Tarea Celery para generar reportes PDF
-    """
-    db = get_db()
-    report = db.query(Report).filter(Report.id == report_id).first()
-    if not report or not report.statistics:
-        return
-    
-    # Crear directorio si no existe
-    Path("uploads/reports").mkdir(parents=True, exist_ok=True)
-    
+def render_pdf_report(report: Report, output_path: str) -> None:
     # Preparar datos para el reporte
     statistics_data = []
     for stat in report.statistics:
+        # Cada proceso del pool lee sus datos desde el almacenamiento
         statistics_data.append({
             "title": stat.title,
             "description": stat.description,
-            "data": stat.data,
+            "statistic_id": stat.id,
+            "version": stat.version,
             "metadata": stat.metadata
         })
     
@@ -74,10 +73,349 @@ def generate_pdf_report(report_id: int) -> None:
     )
     
     # Generar PDF
-    output_path = f"uploads/reports/{report_id}.pdf"
     generate_pdf(html_content, output_path)
+
+# Extensión y función de generación por tipo de reporte
+RENDERERS = {
+    ReportType.EXCEL: ("xlsx", render_excel_report),
+    ReportType.PDF: ("pdf", render_pdf_report),
+}
+
+def publish_report(report: Report) -> Optional[str]:
+    """
+    Generar el archivo de un reporte reutilizando el artefacto existente si
+    otro reporte (o una generación anterior) ya produjo el mismo contenido.
+    Retorna la ruta publicada; quien llama guarda report.file_path y confirma.
+    """
+    if report.type not in RENDERERS:
+        return None
+    extension, render = RENDERERS[report.type]
+    fingerprint = artifacts.report_fingerprint(
+        report,
+        table_policy=settings.PDF_TABLE_POLICY,
+        table_max_rows=settings.PDF_TABLE_MAX_ROWS,
+    )
+    artifact = artifacts.get_or_render(
+        fingerprint, extension, lambda path: render(report, path)
+    )
     
-    # Actualizar la ruta del archivo en el reporte
-    report.file_path = output_path
-    db.add(report)
-    db.commit() 
\ No newline at end of file
+    output_path = f"{settings.UPLOAD_DIR}/reports/{report.id}.{extension}"
+    artifacts.link_artifact(artifact, Path(output_path))
+    return output_path
+
+def generate_report(report_id: int) -> None:
+    with get_db() as db:
+        report = db.query(Report).options(selectinload(Report.statistics)).filter(
+            Report.id == report_id
+        ).first()
+        if not report or not report.statistics:
+            return
+        
+        # Actualizar la ruta del archivo en el reporte
+        report.file_path = publish_report(report)
+        db.add(report)
+        db.commit()
+
+@celery_app.task(bind=True)
+def generate_excel_report(self, report_id: int, token: Optional[int] = None) -> None:
+    """
+    Tarea Celery para generar reportes Excel
+    """
+    with regeneration.coalesced(self, report_id, token) as latest:
+        if latest:
+            generate_report(report_id)
+
+@celery_app.task(bind=True)
+def generate_pdf_report(self, report_id: int, token: Optional[int] = None) -> None:
+    """
+    Tarea Celery para generar reportes PDF
+    """
+    with regeneration.coalesced(self, report_id, token) as latest:
+        if latest:
+            generate_report(report_id)
+
+@celery_app.task
+def generate_reports_batch(report_ids: List[int]) -> Dict[str, Any]:
+    """
+    Tarea Celery para generar muchos reportes en una sola sesión: los reportes
+    y sus estadísticas se cargan con dos consultas y las rutas se guardan en
+    un solo commit. Los reportes que otra tarea está generando se omiten.
+    """
+    result: Dict[str, Any] = {"generated": [], "skipped": [], "failed": {}}
+    with get_db() as db:
+        reports = db.query(Report).options(selectinload(Report.statistics)).filter(
+            Report.id.in_(report_ids)
+        ).all()
+        
+        for report in reports:
+            if not report.statistics or report.type not in RENDERERS:
+                result["skipped"].append(report.id)
+                continue
+            lock = regeneration.acquire_lock(report.id)
+            if lock is None:
+                result["skipped"].append(report.id)
+                continue
+            try:
+                report.file_path = publish_report(report)
+                result["generated"].append(report.id)
+            except Exception as e:
+                logger.exception("Error al generar el reporte %s", report.id)
+                result["failed"][str(report.id)] = str(e)
+            finally:
+                regeneration.release_lock(lock)
+        
+        db.commit()
+    return result
+
+def enqueue_report_generation(report_id: int, report_type: ReportType) -> None:
+    """
+    Programar la regeneración de un reporte después de una breve espera.
+    Las solicitudes que llegan dentro de la espera se agrupan: solo la última
+    genera el archivo y las anteriores terminan sin hacer nada.
+    """
+    if report_type == ReportType.EXCEL:
+        task = generate_excel_report
+    elif report_type == ReportType.PDF:
+        task = generate_pdf_report
+    else:
+        return
+    token = regeneration.next_token(report_id)
+    task.apply_async(args=[report_id, token], countdown=settings.REPORT_DEBOUNCE_SECONDS)
+
+def enqueue_dashboard_refresh(config_id: int) -> None:
+    """
+    Programar el recálculo de las series de un dashboard después de una breve
+    espera. Las solicitudes que llegan dentro de la espera no encolan otra
+    tarea: la programada lee la configuración vigente cuando se ejecuta.
+    """
+    ttl = settings.DASHBOARD_REFRESH_DEBOUNCE_SECONDS
+    if regeneration.claim_dashboard_refresh(config_id, ttl):
+        refresh_dashboard_series.apply_async(args=[config_id], countdown=ttl)
+
+def update_ingest_job(job_id: int, **fields: Any) -> None:
+    """
+    Actualizar el avance de un trabajo de carga en su propia sesión, para no
+    confirmar la transacción de la estadística que se está creando
+    """
+    with get_db() as db:
+        db.query(IngestJob).filter(IngestJob.id == job_id).update(fields)
+        db.commit()
+
+def track_progress(
+    job_id: int, chunks: Iterator[ingest.Chunk], reader: ingest.CountingReader, total_bytes: int
+) -> Iterator[ingest.Chunk]:
+    rows_parsed = 0
+    for chunk in chunks:
+        rows_parsed += len(chunk)
+        update_ingest_job(
+            job_id,
+            rows_parsed=rows_parsed,
+            bytes_read=min(reader.bytes_read, total_bytes),
+        )
+        yield chunk
+
+@celery_app.task
+def ingest_statistic(job_id: int) -> None:
+    """
+    Tarea Celery para cargar una planilla (Excel, CSV o Parquet) como estadística
+    """
+    db = SessionLocal()
+    statistic_id = None
+    file_path = None
+    try:
+        job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+        if not job or job.status != JobStatus.PENDING:
+            return
+        file_path = job.file_path
+        update_ingest_job(job_id, status=JobStatus.RUNNING)
+        
+        statistic = Statistic(
+            title=job.title,
+            description=job.description,
+            category=job.category,
+            data={},
+            version=1,
+            source_file=job.source_file,
+        )
+        db.add(statistic)
+        db.flush()
+        statistic_id = statistic.id
+        
+        with open(file_path, "rb") as file:
+            reader = ingest.CountingReader(file)
+            summary = ingest.write_file_chunks(
+                reader,
+                job.source_file,
+                statistic.id,
+                statistic.version,
+                lambda chunks: track_progress(job_id, chunks, reader, job.total_bytes),
+            )
+        
+        statistic.data = summary
+        statistic.metadata = {
+            "columns": summary["columns"],
+            "rows": summary["rows"],
+            "schema": storage.read_statistic_schema(statistic.id, statistic.version)
+        }
+        db.add(StatisticVersion(
+            statistic_id=statistic.id,
+            version=statistic.version,
+            change=VersionChange.UPLOAD,
+            data=summary,
+            user_id=job.user_id
+        ))
+        db.commit()
+        update_ingest_job(
+            job_id,
+            status=JobStatus.COMPLETED,
+            rows_parsed=summary["rows"],
+            bytes_read=job.total_bytes,
+            statistic_id=statistic_id,
+        )
+    except Exception as e:
+        db.rollback()
+        if statistic_id is not None:
+            storage.delete_statistic_data(statistic_id)
+        update_ingest_job(job_id, status=JobStatus.FAILED, error=str(e))
+    finally:
+        # La copia temporal del archivo subido ya no se necesita
+        if file_path:
+            Path(file_path).unlink(missing_ok=True)
+        db.close()
+
+def reserve_statistic_ids(db: Session, count: int) -> List[int]:
+    """
+    Reservar ids de la secuencia de estadísticas antes de insertarlas, para que
+    los procesos de carga escriban directamente en su ubicación definitiva
+    """
+    ids = db.execute(
+        select(func.nextval("statistics_id_seq")).select_from(func.generate_series(1, count))
+    ).scalars().all()
+    return list(ids)
+
+@celery_app.task
+def ingest_statistics_batch(batch_id: str) -> None:
+    """
+    Tarea Celery para una carga masiva: los archivos se leen en paralelo en un
+    pool de procesos y las estadísticas resultantes se insertan juntas en una
+    sola transacción. Cada archivo queda con su propio resultado en su trabajo.
+    """
+    with get_db() as db:
+        jobs = db.query(IngestJob).filter(
+            IngestJob.batch_id == batch_id,
+            IngestJob.status == JobStatus.PENDING
+        ).order_by(IngestJob.id).all()
+        if not jobs:
+            return
+        for job in jobs:
+            job.status = JobStatus.RUNNING
+        db.commit()
+        
+        statistic_ids = reserve_statistic_ids(db, len(jobs))
+        try:
+            outcomes = ingest.ingest_files([
+                (job.file_path, job.source_file, statistic_id)
+                for job, statistic_id in zip(jobs, statistic_ids)
+            ])
+            
+            statistics = []
+            versions = []
+            for job, statistic_id, (summary, error) in zip(jobs, statistic_ids, outcomes):
+                if error is not None:
+                    storage.delete_statistic_data(statistic_id)
+                    job.status = JobStatus.FAILED
+                    job.error = error
+                    continue
+                statistics.append({
+                    "id": statistic_id,
+                    "title": job.title,
+                    "description": job.description,
+                    "category": job.category,
+                    "data": summary,
+                    "metadata": {
+                        "columns": summary["columns"],
+                        "rows": summary["rows"],
+                        "schema": storage.read_statistic_schema(statistic_id, 1)
+                    },
+                    "version": 1,
+                    "source_file": job.source_file,
+                })
+                versions.append({
+                    "statistic_id": statistic_id,
+                    "version": 1,
+                    "change": VersionChange.UPLOAD,
+                    "data": summary,
+                    "user_id": job.user_id,
+                })
+                job.status = JobStatus.COMPLETED
+                job.rows_parsed = summary["rows"]
+                job.bytes_read = job.total_bytes
+                job.statistic_id = statistic_id
+            
+            if statistics:
+                db.bulk_insert_mappings(Statistic, statistics)
+                db.bulk_insert_mappings(StatisticVersion, versions)
+            db.commit()
+        except Exception as e:
+            logger.exception("Error en la carga masiva %s", batch_id)
+            db.rollback()
+            for statistic_id in statistic_ids:
+                storage.delete_statistic_data(statistic_id)
+            db.query(IngestJob).filter(IngestJob.id.in_([job.id for job in jobs])).update(
+                {"status": JobStatus.FAILED, "error": str(e)}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            # Las copias temporales de los archivos subidos ya no se necesitan
+            for job in jobs:
+                Path(job.file_path).unlink(missing_ok=True)
+
+@celery_app.task
+def compact_statistic(statistic_id: int) -> None:
+    """
+    Tarea Celery para reescribir en segmentos completos la versión vigente de
+    una estadística formada por muchos segmentos o con muchas filas reemplazadas
+    """
+    with get_db() as db:
+        # El lock de la fila impide agregar filas mientras se compacta
+        statistic = db.query(Statistic).filter(Statistic.id == statistic_id).with_for_update().first()
+        if not statistic:
+            return
+        summary = storage.compact_statistic_version(statistic.id, statistic.version)
+        if summary is not None:
+            statistic.data = summary
+            statistic.metadata = {
+                **(statistic.metadata or {}),
+                "schema": storage.read_statistic_schema(statistic.id, statistic.version)
+            }
+            db.query(StatisticVersion).filter(
+                StatisticVersion.statistic_id == statistic.id,
+                StatisticVersion.version == statistic.version
+            ).update({"data": summary}, synchronize_session=False)
+        db.commit()
+    if summary is not None:
+        cache.invalidate(cache.statistic_key(statistic_id))
+
+@celery_app.task
+def refresh_dashboard_series(config_id: int) -> None:
+    """
+    Tarea Celery para recalcular las series desactualizadas de un dashboard
+    """
+    with get_db() as db:
+        config = db.query(DashboardConfig).filter(DashboardConfig.id == config_id).first()
+        if config:
+            dashboards.refresh_config_series(db, config)
+
+@celery_app.task
+def refresh_statistic_series(statistic_id: int) -> None:
+    """
+    Tarea Celery para recalcular las series de los dashboards que usan una estadística
+    """
+    with get_db() as db:
+        config_ids = [
+            row.config_id for row in db.query(WidgetSeries.config_id).filter(
+                WidgetSeries.statistic_id == statistic_id
+            ).distinct()
+        ]
+        for config in db.query(DashboardConfig).filter(DashboardConfig.id.in_(config_ids)).all():
+            dashboards.refresh_config_series(db, config)
@@ -0,0 +1,25 @@
+import os
+
+# La configuración exige estas variables al importar la aplicación
+for name, value in {
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test",
+    "POSTGRES_DB": "test",
+    "SECRET_KEY": "test",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest
+
+from app.core import storage
+
+@pytest.fixture(autouse=True)
+def storage_dir(tmp_path, monkeypatch):
+    """
+    Almacenamiento de estadísticas en un directorio temporal por prueba
+    """
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path / "statistics")
+    return tmp_path / "statistics"
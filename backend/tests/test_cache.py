@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+import pytest
+import redis
+
+from app.core import cache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def local(monkeypatch):
+    local_cache = cache.LocalCache(1024)
+    monkeypatch.setattr(cache, "_cache", local_cache)
+    return local_cache
+
+def test_local_cache_expires_entries(clock):
+    local_cache = cache.LocalCache(1024)
+    local_cache.set("a", b"uno", 10)
+
+    clock[0] += 9
+    assert local_cache.get("a") == b"uno"
+    clock[0] += 2
+    assert local_cache.get("a") is None
+
+def test_local_cache_caps_ttl(clock):
+    local_cache = cache.LocalCache(1024, max_ttl=5)
+    local_cache.set("a", b"uno", 300)
+
+    clock[0] += 6
+    assert local_cache.get("a") is None
+
+def test_local_cache_without_ttl_stores_nothing():
+    local_cache = cache.LocalCache(1024, max_ttl=0)
+    local_cache.set("a", b"uno", 300)
+
+    assert local_cache.get("a") is None
+
+def test_local_cache_evicts_least_recently_used_by_bytes():
+    local_cache = cache.LocalCache(10)
+    local_cache.set("a", b"1234", 60)
+    local_cache.set("b", b"1234", 60)
+    local_cache.get("a")
+    local_cache.set("c", b"1234", 60)
+
+    assert local_cache.get("a") == b"1234"
+    assert local_cache.get("b") is None
+    assert local_cache.get("c") == b"1234"
+
+def test_local_cache_ignores_values_larger_than_limit():
+    local_cache = cache.LocalCache(4)
+    local_cache.set("a", b"12345", 60)
+
+    assert local_cache.get("a") is None
+
+def test_response_round_trip(local):
+    modified = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cache.set_response("statistic:1", '"abc"', modified, b'{"id": 1}')
+
+    assert cache.get_response("statistic:1") == cache.CachedResponse('"abc"', modified, b'{"id": 1}')
+    assert cache.get_response("statistic:2") is None
+
+def test_response_larger_than_entry_limit_is_not_stored(local, monkeypatch):
+    monkeypatch.setattr(cache.settings, "CACHE_MAX_ENTRY_BYTES", 4)
+    cache.set_response("statistic:1", '"abc"', None, b"12345")
+
+    assert cache.get_response("statistic:1") is None
+
+def test_invalidate_removes_entries(local):
+    cache.set_response(cache.statistic_key(1), '"abc"', None, b"{}")
+    cache.set_response(cache.statistic_key(2), '"def"', None, b"{}")
+    cache.invalidate(cache.statistic_key(1))
+
+    assert cache.get_response(cache.statistic_key(1)) is None
+    assert cache.get_response(cache.statistic_key(2)) is not None
+
+class DownRedis:
+    def get(self, key):
+        raise redis.ConnectionError("sin conexión")
+
+    def set(self, key, value, ex=None):
+        raise redis.ConnectionError("sin conexión")
+
+    def delete(self, *keys):
+        raise redis.ConnectionError("sin conexión")
+
+def test_redis_cache_falls_back_to_local_cache():
+    fallback = cache.LocalCache(1024)
+    redis_cache = cache.RedisCache(DownRedis(), fallback)
+    redis_cache.set("a", b"uno", 60)
+
+    assert redis_cache.get("a") == b"uno"
+    redis_cache.delete("a")
+    assert redis_cache.get("a") is None
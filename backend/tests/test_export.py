@@ -0,0 +1,13 @@
+import pandas as pd
+
+from app.core import export, storage
+
+def test_csv_of_empty_statistic_has_header():
+    storage.write_statistic_chunks(1, 1, [pd.DataFrame({"comuna": pd.Series([], dtype=object), "valor": []})])
+
+    assert b"".join(export.iter_csv(1, 1)) == b'"comuna","valor"\n'
+
+def test_csv_writes_header_once():
+    storage.write_statistic_chunks(1, 1, [pd.DataFrame({"comuna": ["A", "B"], "valor": [1, 2]})])
+
+    assert b"".join(export.iter_csv(1, 1)).splitlines() == [b'"comuna","valor"', b'"A",1', b'"B",2']
@@ -0,0 +1,23 @@
+import pytest
+
+from app.core.files import parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 900)),
+    ("bytes=900-2000", (900, 100)),
+    ("bytes=-100", (900, 100)),
+    ("bytes=-5000", (0, 1000)),
+    (" bytes=10-19 ", (10, 10)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["bytes=0-9,20-29", "items=0-9", "bytes=-", "bytes=a-b"])
+def test_unusable_ranges_send_the_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
@@ -0,0 +1,25 @@
+import io
+
+from app.core import ingest, storage
+from app.core.config import settings
+
+def write_csv(content: str, monkeypatch) -> dict:
+    # Bloques chicos para que el tipo de cada columna se infiera solo de las primeras filas
+    monkeypatch.setattr(settings, "INGEST_CSV_BLOCK_SIZE", 64)
+    return ingest.write_file_chunks(io.BytesIO(content.encode()), "datos.csv", 1, 1)
+
+def test_csv_integers_followed_by_decimals_stay_numeric(monkeypatch):
+    rows = "".join(f"{index},{index}\n" for index in range(40))
+    write_csv(f"id,valor\n{rows}40,2.5\n", monkeypatch)
+
+    schema = {column["name"]: column["type"] for column in storage.read_statistic_schema(1, 1)}
+    assert schema["valor"] == "float"
+    assert storage.read_statistic_data(1, 1)["valor"].iloc[-1] == 2.5
+
+def test_csv_numbers_followed_by_text_become_text(monkeypatch):
+    rows = "".join(f"{index},{index}\n" for index in range(40))
+    write_csv(f"id,valor\n{rows}40,sin dato\n", monkeypatch)
+
+    schema = {column["name"]: column["type"] for column in storage.read_statistic_schema(1, 1)}
+    assert schema["id"] == "integer"
+    assert schema["valor"] == "text"
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from app.core import query
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "comuna": pd.Categorical(["B", "A", "B"]),
+        "anio": [2020, 2021, 2021],
+        "valor": [1.0, 2.0, 3.0],
+    })
+
+def test_query_requires_group_by_or_aggregation(df):
+    with pytest.raises(ValueError):
+        query.referenced_columns([], [], query.parse_filters(["anio:eq:2021"]))
+    with pytest.raises(ValueError):
+        query.run_query(df, [], [], query.parse_filters(["anio:eq:2021"]), [])
+
+def test_group_by_with_filters(df):
+    result = query.run_query(
+        df, ["comuna"], query.parse_aggregations(["valor:sum"]), query.parse_filters(["anio:gte:2021"]), [("comuna", True)]
+    )
+
+    assert result["comuna"].tolist() == ["A", "B"]
+    assert result["valor_sum"].tolist() == [2.0, 3.0]
+
+def test_sum_of_text_column_is_rejected(df):
+    with pytest.raises(ValueError):
+        query.run_query(df, [], query.parse_aggregations(["comuna:sum"]), [], [])
+
+def test_min_and_max_of_categorical_use_values(df):
+    result = query.run_query(df, [], query.parse_aggregations(["comuna:min", "comuna:max"]), [], [])
+
+    assert result.iloc[0].tolist() == ["A", "B"]
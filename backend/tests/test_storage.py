@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+from app.core import storage
+
+STATISTIC_ID = 1
+
+def frame(ids, comunas, values) -> pd.DataFrame:
+    return pd.DataFrame({"id": ids, "comuna": comunas, "valor": values})
+
+def read(version: int) -> pd.DataFrame:
+    return storage.decode_categoricals(storage.read_statistic_data(STATISTIC_ID, version))
+
+def segment_files(version: int) -> list:
+    return [segment["file"] for segment in storage.load_manifest(STATISTIC_ID, version)["segments"]]
+
+@pytest.fixture
+def base():
+    df = frame([1, 2, 3], ["A", "B", "C"], [10.5, 20.5, 30.5])
+    storage.write_statistic_chunks(STATISTIC_ID, 1, [df])
+    return df
+
+def test_append_reuses_segments(base):
+    summary = storage.append_statistic_rows(STATISTIC_ID, 1, 2, frame([4], ["D"], [40.5]))
+
+    assert summary["rows"] == 4
+    assert segment_files(2)[:-1] == segment_files(1)
+    assert read(2)["id"].tolist() == [1, 2, 3, 4]
+    assert len(read(1)) == 3
+
+def test_append_rewrites_when_values_do_not_fit(base):
+    summary = storage.append_statistic_rows(STATISTIC_ID, 1, 2, frame([10 ** 12], ["D"], [40.5]))
+
+    assert summary["rows"] == 4
+    assert not set(segment_files(2)) & set(segment_files(1))
+    assert read(2)["id"].tolist() == [1, 2, 3, 10 ** 12]
+    assert read(1)["id"].tolist() == [1, 2, 3]
+
+def test_append_rewrites_when_floats_lose_precision(base):
+    assert storage.read_statistic_schema(STATISTIC_ID, 1)[2]["storage"] == "float"
+    summary = storage.append_statistic_rows(STATISTIC_ID, 1, 2, frame([4], ["D"], [0.1]))
+
+    assert summary["rows"] == 4
+    assert storage.read_statistic_schema(STATISTIC_ID, 2)[2]["storage"] == "double"
+    assert read(2)["valor"].tolist() == [10.5, 20.5, 30.5, 0.1]
+
+def test_upsert_counts_unchanged_changed_and_new_keys(base):
+    rows = frame([1, 2, 4], ["A", "X", "D"], [10.5, 20.5, 40.5])
+    summary, counts = storage.upsert_statistic_rows(STATISTIC_ID, 1, 2, rows, ["id"])
+
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+    assert summary["rows"] == 4
+    assert summary["deleted_rows"] == 1
+    assert segment_files(2)[0] == segment_files(1)[0]
+    result = read(2).sort_values("id").reset_index(drop=True)
+    assert result["comuna"].tolist() == ["A", "X", "C", "D"]
+
+def test_upsert_without_changes_creates_no_version(base):
+    summary, counts = storage.upsert_statistic_rows(STATISTIC_ID, 1, 2, base.iloc[:2], ["id"])
+
+    assert summary is None
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 2}
+    assert not storage.version_exists(STATISTIC_ID, 2)
+
+def test_upsert_rewrites_when_values_do_not_fit(base):
+    rows = pd.DataFrame({"id": [2], "comuna": ["B"], "valor": ["sin dato"]})
+    summary, counts = storage.upsert_statistic_rows(STATISTIC_ID, 1, 2, rows, ["id"])
+
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 0}
+    assert summary["rows"] == 3
+    result = read(2).sort_values("id").reset_index(drop=True)
+    assert result["valor"].tolist() == ["10.5", "sin dato", "30.5"]
+
+def test_read_rows_across_masked_segments(base):
+    storage.append_statistic_rows(STATISTIC_ID, 1, 2, frame([4, 5], ["D", "E"], [40.5, 50.5]))
+    storage.upsert_statistic_rows(STATISTIC_ID, 2, 3, frame([2, 4], ["Y", "Z"], [0.5, 0.5]), ["id"])
+    expected = read(3)
+
+    assert expected["id"].tolist() == [1, 3, 5, 2, 4]
+    for offset in range(len(expected) + 1):
+        for limit in (1, 2, 10):
+            rows = storage.decode_categoricals(storage.read_statistic_rows(STATISTIC_ID, 3, offset, limit))
+            pd.testing.assert_frame_equal(rows, expected.iloc[offset:offset + limit].reset_index(drop=True))
+
+def test_diff_with_key(base):
+    storage.upsert_statistic_rows(STATISTIC_ID, 1, 2, frame([2, 4], ["X", "D"], [20.5, 40.5]), ["id"])
+    diff = storage.diff_statistic_versions(STATISTIC_ID, 1, 2, ["id"])
+
+    assert diff["added"]["id"].tolist() == [4]
+    assert diff["removed"].empty
+    assert diff["changed"]["comuna"].tolist() == ["X"]
+    assert diff["previous"]["comuna"].tolist() == ["B"]
+
+def test_diff_without_key(base):
+    storage.upsert_statistic_rows(STATISTIC_ID, 1, 2, frame([2, 4], ["X", "D"], [20.5, 40.5]), ["id"])
+    diff = storage.diff_statistic_versions(STATISTIC_ID, 1, 2)
+
+    assert sorted(diff["added"]["comuna"].tolist()) == ["D", "X"]
+    assert diff["removed"]["comuna"].tolist() == ["B"]
+    assert diff["changed"].empty
+
+def test_diff_reports_column_changes(base):
+    storage.write_statistic_chunks(STATISTIC_ID, 2, [base.drop(columns="valor").assign(anio=2024)])
+    diff = storage.diff_statistic_versions(STATISTIC_ID, 1, 2)
+
+    assert diff["columns_added"] == ["anio"]
+    assert diff["columns_removed"] == ["valor"]
+    assert diff["added"].empty and diff["removed"].empty
+
+def test_identical_versions_share_segments(base, storage_dir):
+    storage.write_statistic_chunks(STATISTIC_ID, 2, [base])
+
+    assert segment_files(2) == segment_files(1)
+    assert len(list((storage_dir / str(STATISTIC_ID) / storage.SEGMENTS_DIR).iterdir())) == 1
+    diff = storage.diff_statistic_versions(STATISTIC_ID, 1, 2)
+    assert diff["added"].empty and diff["removed"].empty
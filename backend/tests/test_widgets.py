@@ -0,0 +1,21 @@
+import pandas as pd
+
+from app.core import storage, widgets
+
+def test_unreadable_statistic_only_fails_its_widgets():
+    storage.write_statistic_chunks(1, 1, [pd.DataFrame({"comuna": ["A", "B", "A"], "valor": [1, 2, 3]})])
+    chart = {"xField": "comuna", "yFields": ["valor"]}
+    results = widgets.resolve_widgets(
+        [
+            {"id": "ok", "type": "bar", "statistic_id": 1, "config": chart},
+            {"id": "roto", "type": "bar", "statistic_id": 2, "config": chart},
+        ],
+        # La estadística 2 existe en la base pero no tiene archivos de datos
+        {1: (1, ["comuna", "valor"]), 2: (1, ["comuna", "valor"])},
+    )
+
+    ok, broken = results
+    assert ok["error"] is None
+    assert ok["data"]["labels"] == ["A", "B"]
+    assert broken["data"] is None
+    assert broken["error"] == "No se pudieron leer los datos de la estadística"